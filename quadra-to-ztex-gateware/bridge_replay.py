@@ -0,0 +1,761 @@
+#!/usr/bin/env python3
+#
+# Replay 68040 bus traces into a simulation of the PDS040 bridge (mc68040_fsm.MC68040_FSM)
+# and report throughput, latency percentiles and stall breakdown per trace.
+#
+# Trace format (one bus transaction per line, '#' starts a comment):
+#
+#   <gap> <op> <size> <address> [<data> ...] [tt=<n>] [tm=<n>]
+#
+#   gap     : idle CPU clock cycles between the end of the previous transaction and TS
+#   op      : R (read) or W (write)
+#   size    : B (byte), W (word), L (long) or 16 (line, 4 long beats)
+#   address : hex, the address as seen by the 68040 (e.g. fe001000 for the framebuffer window)
+#   data    : hex long words for writes (one per beat, the 68040 view, i.e. big endian)
+#             for B/W sizes, only the low-order 8/16 bits are used
+#   tt, tm  : optional transfer type/modifier (default 0/1, normal user data access)
+#
+# Examples:
+#   2 R L fe001000
+#   0 W 16 fe002000 11111111 22222222 33333333 44444444
+#   4 W B fe0a0003 5a
+#
+# The traces in traces/synthetic are not bus captures: they are the output of 'generate', synthetic workloads
+# modelled on what QuickDraw, the Slot Manager & the driver do on the bus (see the _gen_* functions below).
+# Captures from the hardware would go next to them, in the same format.
+#
+# Usage:
+#   python3 bridge_replay.py generate --out-dir traces/synthetic
+#   python3 bridge_replay.py run traces/synthetic/*.trace --json base.json
+#   python3 bridge_replay.py run traces/synthetic/*.trace --set dram_read_latency=20 --json slow.json
+#   python3 bridge_replay.py compare base.json slow.json
+#
+
+import os
+import sys
+import json
+import random
+import argparse
+
+from migen import *
+from migen.sim import passive
+from migen.fhdl.specials import Tristate
+
+from litex.soc.interconnect import wishbone
+from litedram.common import LiteDRAMNativePort
+
+import mc68040_fsm
+import declrom_shadow
+import scratchpad
+
+# Default configuration of the simulated environment ------------------------------------------------
+
+default_config = {
+    "cpu_period_ns"      : 40, # 25 MHz Quadra 700 bus clock
+    "sys_period_ns"      : 10, # 100 MHz SoC clock
+    "wb_read_latency"    : 12, # cpu cycles from stb to ack on the (CDC) read wishbone
+    "wb_write_latency"   : 4,  # sys cycles from stb to ack on the write wishbone
+    "wb_data_width"      : 32, # width of the bridge wishbone interfaces (32 or 128)
+    "dram_read_latency"  : 8,  # cpu cycles from cmd accepted to rdata valid
+    "dram_write_latency" : 2,  # cpu cycles from cmd accepted to wdata ready
+    "dram_write_cmds"    : 4,  # write commands the port accepts ahead of their data
+    "declrom_shadow"     : False,      # serve the declaration ROM from a DeclROMShadow
+    "write_queues"       : False,      # per-target write queues as in the SoC (framebuffer/SDRAM, CSRs)
+    "write_queues_relaxed" : False,    # ... without ordering CSR writes after framebuffer writes
+    "scratchpad"         : False,      # serve the scratchpad window from a Scratchpad
+    "csr_write_latency"  : 4,  # sys cycles from stb to ack for writes to the direct slot window (CSRs, ...)
+    "rom_base"           : 0xf0fff800, # wishbone address of the (simulated) declaration ROM
+    "rom_size"           : 0x800,      # smaller than the real one, to keep the shadow copy short
+    "max_cycles"         : 2000000,
+}
+
+# Simulation platform -------------------------------------------------------------------------------
+
+class _SimPlatform:
+    # widths of the PDS040 pads requested by the bridge, see ztex213_pds040.py
+    _pads = {
+        "A_3v3"           : 32,
+        "D_3v3"           : 32,
+        "rw_3v3_n"        : 1,
+        "siz_3v3"         : 2,
+        "tbi_3v3_n"       : 1,
+        "tip_cpu_3v3_n"   : 1,
+        "ta_3v3_n"        : 1,
+        "tea_3v3_n"       : 1,
+        "ts_3v3_n"        : 1,
+        "tt_3v3"          : 2,
+        "tm_3v3"          : 3,
+        "mi_3v3_n"        : 1,
+        "bb_3v3_n"        : 1,
+        "user_led"        : 1,
+    }
+    _reset = {
+        "rw_3v3_n" : 1,
+        "ts_3v3_n" : 1,
+        "ta_3v3_n" : 1,
+        "tea_3v3_n" : 1,
+        "tbi_3v3_n" : 1,
+        "tip_cpu_3v3_n" : 1,
+        "mi_3v3_n" : 1,
+        "bb_3v3_n" : 1,
+    }
+
+    def __init__(self):
+        self.pads = {}
+
+    def request(self, name, number=None):
+        pad = Signal(self._pads[name], name=name, reset=self._reset.get(name, 0))
+        self.pads[(name, number)] = pad
+        return pad
+
+    def add_platform_command(self, *args, **kwargs):
+        pass
+
+class _SimSoC:
+    def __init__(self, platform):
+        self.platform = platform
+
+# Tristate lowering: the testbench drives the pad, the bridge reads back its own value when driving
+class _SimTristates:
+    def __init__(self):
+        self.by_target = {}
+
+    def lower(self, tristate):
+        self.by_target[tristate.target.duid] = tristate
+        m = Module()
+        m.comb += tristate.i.eq(Mux(tristate.oe, tristate.o, tristate.target))
+        return m
+
+class _BridgeSim(Module):
+    def __init__(self, config, bridge_args):
+        self.platform = platform = _SimPlatform()
+        self.wb_read = wishbone.Interface(data_width=config["wb_data_width"])
+        self.wb_write = wishbone.Interface(data_width=config["wb_data_width"])
+        self.dram_native_r = LiteDRAMNativePort("read", 28, 128, clock_domain="cpu")
+        self.dram_native_w = LiteDRAMNativePort("write", 28, 128, clock_domain="cpu")
+        self.wb_write_queues = []
+        if (config["write_queues"]):
+            after = [] if config["write_queues_relaxed"] else ["fb"]
+            self.wb_write_fb = wishbone.Interface(data_width=config["wb_data_width"])
+            self.wb_write_csr = wishbone.Interface(data_width=config["wb_data_width"])
+            self.wb_write_queues = [ ("fb", self.wb_write_fb, 0x80000000, 0x10000000, []),
+                                     ("csr", self.wb_write_csr, 0xf0800000, 0x00800000, after) ]
+            bridge_args = dict(bridge_args, write_queues=self.wb_write_queues, fence_address=0xfebffff0)
+        if (config["declrom_shadow"]):
+            self.submodules.declrom_shadow = declrom_shadow.DeclROMShadow(rom_base=config["rom_base"], rom_size=config["rom_size"], cd_cpu="cpu")
+            bridge_args = dict(bridge_args, declrom_shadow=self.declrom_shadow)
+        else:
+            self.declrom_shadow = None
+        if (config["scratchpad"]):
+            self.submodules.scratchpad = scratchpad.Scratchpad(base=0xf0c00000, cd_cpu="cpu")
+            bridge_args = dict(bridge_args, scratchpad=self.scratchpad)
+        self.submodules.bridge = mc68040_fsm.MC68040_FSM(soc=_SimSoC(platform),
+                                                         wb_read=self.wb_read,
+                                                         wb_write=self.wb_write,
+                                                         dram_native_r=self.dram_native_r,
+                                                         dram_native_w=self.dram_native_w,
+                                                         cd_cpu="cpu",
+                                                         **bridge_args)
+
+    def pad(self, name):
+        return self.platform.pads[(name, None)]
+
+# Trace parsing -------------------------------------------------------------------------------------
+
+_sizes = { "B": (1, 1), "W": (2, 2), "L": (0, 4), "16": (3, 16) } # SIZ encoding, bytes
+
+class Transaction:
+    def __init__(self, gap, op, size, adr, data, tt=0, tm=1):
+        self.gap = gap
+        self.op = op
+        self.size = size
+        self.adr = adr
+        self.data = data
+        self.tt = tt
+        self.tm = tm
+
+    def beats(self):
+        return 4 if (self.size == "16") else 1
+
+    def nbytes(self):
+        return _sizes[self.size][1]
+
+    def kind(self):
+        return self.op + self.size
+
+    def __str__(self):
+        s = f"{self.gap} {self.op} {self.size} {self.adr:08x}"
+        for d in self.data:
+            s += f" {d:08x}"
+        if (self.tt != 0) or (self.tm != 1):
+            s += f" tt={self.tt} tm={self.tm}"
+        return s
+
+def parse_trace(lines):
+    txns = []
+    for lineno, line in enumerate(lines, 1):
+        line = line.split("#")[0].strip()
+        if (not line):
+            continue
+        fields = line.split()
+        opts = dict(f.split("=") for f in fields if "=" in f)
+        fields = [f for f in fields if "=" not in f]
+        if ((len(fields) < 4) or (fields[1] not in ("R", "W")) or (fields[2] not in _sizes)):
+            raise ValueError(f"line {lineno}: malformed transaction '{line}'")
+        gap, op, size, adr = int(fields[0]), fields[1], fields[2], int(fields[3], 16)
+        data = [int(d, 16) for d in fields[4:]]
+        txn = Transaction(gap, op, size, adr, data, tt=int(opts.get("tt", 0)), tm=int(opts.get("tm", 1)))
+        if (adr % txn.nbytes()):
+            raise ValueError(f"line {lineno}: misaligned address {adr:08x}")
+        if (op == "W") and (len(data) != txn.beats()):
+            raise ValueError(f"line {lineno}: expected {txn.beats()} data word(s)")
+        txns.append(txn)
+    return txns
+
+def load_trace(filename):
+    with open(filename) as f:
+        return parse_trace(f.readlines())
+
+# 68040 byte lanes: offset 0 is D[31:24]
+def _lane_shift(adr, nbytes):
+    return 8 * (4 - nbytes - (adr & 3))
+
+# 68040 address -> SoC address (as rewritten by the bridge), None if not the card's
+def _soc_address(adr):
+    if ((adr >> 24) == 0xfe): # slot space, first 8 MiB to the end of SDRAM, then direct
+        return (0xf0800000 if (adr & 0x800000) else 0x8f800000) | (adr & 0x7fffff)
+    if ((adr >> 28) == 0xe): # superslot space, SDRAM
+        return 0x80000000 | (adr & 0x0fffffff)
+    return None
+
+# Replay --------------------------------------------------------------------------------------------
+
+def _percentile(values, p):
+    if (not values):
+        return 0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(p / 100.0 * (len(values) - 1))))]
+
+class _Replay:
+    def __init__(self, txns, config, bridge_args):
+        self.txns = txns
+        self.config = config
+        self.tristates = _SimTristates()
+        self.dut = _BridgeSim(config, bridge_args)
+        self.mem = {}        # byte address (SoC side) -> byte
+        self.expected = {}   # byte address (68040 side) -> byte, only what the trace wrote
+        self.latencies = {}  # kind -> [cycles]
+        self.states = {}     # slave_fsm state -> cycles spent inside transactions
+        self.mismatches = 0
+        self.unlanded = {}   # SoC long word address -> [write sequence number], acknowledged to the 68040 but not written yet
+        self.write_seq = 0
+        self.order_violations = 0 # slow (CSR) writes landing before an earlier SDRAM write
+        self.burst_counters = {}
+        self.cycles = 0
+        self.done = False
+
+    # SoC-side memory, little-endian byte lanes as on wishbone/LiteDRAM
+    def _mem_read(self, adr, nbytes):
+        v = 0
+        for i in range(nbytes):
+            v |= self.mem.get(adr + i, 0) << (8 * i)
+        return v
+
+    def _mem_write(self, adr, nbytes, value, mask):
+        for i in range(nbytes):
+            if (mask >> i) & 1:
+                self.mem[adr + i] = (value >> (8 * i)) & 0xff
+        # write ordering, as seen by the targets: a write to a slow target (e.g. a doorbell) must not land
+        # before a write to SDRAM the 68040 did earlier
+        landed = []
+        for word in range(adr, adr + nbytes, 4):
+            if ((mask >> (word - adr)) & 0xf) and self.unlanded.get(word):
+                landed.append(self.unlanded[word].pop(0))
+        if landed and self._is_slow(adr):
+            first = min(landed)
+            if any((seq < first) for word, seqs in self.unlanded.items() if (word >> 28) == 0x8 for seq in seqs):
+                self.order_violations += 1
+
+    def _is_slow(self, adr):
+        return (adr >= 0xf0800000) and (adr < 0xf1000000)
+
+    # writes tracked for the ordering check, the ones the bridge serves itself never land
+    def _lands(self, soc_adr):
+        if (self.config["scratchpad"] and (soc_adr >= 0xf0c00000) and (soc_adr < 0xf0c02000)):
+            return False
+        return ((soc_adr >> 28) == 0x8) or self._is_slow(soc_adr)
+
+    def _cpu_master(self):
+        dut = self.dut
+        bridge = dut.bridge
+        A, D, RW, SIZ, TS, TT, TM = (dut.pad(n) for n in ("A_3v3", "D_3v3", "rw_3v3_n", "siz_3v3", "ts_3v3_n", "tt_3v3", "tm_3v3"))
+        ta = self.tristates.by_target[dut.pad("ta_3v3_n").duid]
+        tea = self.tristates.by_target[dut.pad("tea_3v3_n").duid]
+        tbi = self.tristates.by_target[dut.pad("tbi_3v3_n").duid]
+        d = self.tristates.by_target[D.duid]
+        fsm = bridge.slave_fsm
+        if (dut.declrom_shadow != None):
+            while not (yield dut.declrom_shadow.done):
+                yield
+        for txn in self.txns:
+            for _ in range(txn.gap):
+                yield
+                self.cycles += 1
+            yield A.eq(txn.adr)
+            yield RW.eq(1 if (txn.op == "R") else 0)
+            yield SIZ.eq(_sizes[txn.size][0])
+            yield TT.eq(txn.tt)
+            yield TM.eq(txn.tm)
+            yield TS.eq(0)
+            beat = 0
+            if (txn.op == "W"):
+                yield D.eq(txn.data[0] << _lane_shift(txn.adr, min(4, txn.nbytes())))
+            latency = 0
+            inhibited = False
+            while (beat < txn.beats()):
+                yield
+                self.cycles += 1
+                latency += 1
+                yield TS.eq(1) # TS is only asserted for one cycle
+                if (self.cycles > self.config["max_cycles"]):
+                    raise RuntimeError(f"bridge stuck on '{txn}'")
+                state = fsm.decoding[(yield fsm.state)]
+                self.states[state] = self.states.get(state, 0) + 1
+                if (yield tea.oe) and not (yield tea.o):
+                    raise RuntimeError(f"bus error on '{txn}'")
+                if (yield ta.oe) and not (yield ta.o):
+                    adr = txn.adr + 4 * beat
+                    if (txn.op == "R"):
+                        value = (yield d.o)
+                        nbytes = min(4, txn.nbytes())
+                        value = (value >> _lane_shift(adr, nbytes)) & ((1 << (8 * nbytes)) - 1)
+                        expected = [self.expected.get(adr + i) for i in range(nbytes)]
+                        got = [(value >> (8 * (nbytes - 1 - i))) & 0xff for i in range(nbytes)]
+                        if any((e is not None) and (e != g) for e, g in zip(expected, got)):
+                            self.mismatches += 1
+                    else:
+                        nbytes = min(4, txn.nbytes())
+                        for i in range(nbytes):
+                            self.expected[adr + i] = (txn.data[beat] >> (8 * (nbytes - 1 - i))) & 0xff
+                        soc_adr = _soc_address(adr)
+                        if (soc_adr != None) and self._lands(soc_adr):
+                            self.unlanded.setdefault(soc_adr & ~3, []).append(self.write_seq)
+                            self.write_seq += 1
+                    beat += 1
+                    if (txn.op == "W") and (beat < txn.beats()):
+                        yield D.eq(txn.data[beat])
+                    if (yield tbi.oe) and not (yield tbi.o):
+                        inhibited = True
+                    if (beat < txn.beats()) and inhibited:
+                        # burst inhibited, the 68040 runs the rest of the line as long word transfers
+                        yield A.eq(txn.adr + 4 * beat)
+                        yield SIZ.eq(_sizes["L"][0])
+                        yield TS.eq(0)
+                        continue
+            self.latencies.setdefault(txn.kind(), []).append(latency)
+        # let the posted writes drain so the next trace starts clean
+        for _ in range(64):
+            yield
+        self.burst_counters = { "lines": (yield bridge.burst_lines.status),
+                                "busy": (yield bridge.burst_busy.status),
+                                "cmd_stalls": (yield bridge.burst_cmd_stalls.status) }
+        if hasattr(bridge, "move16_prefetch_hits"):
+            self.burst_counters["move16_prefetch_hits"] = (yield bridge.move16_prefetch_hits.status)
+        self.done = True
+
+    @passive
+    def _wb_read_slave(self, wb, latency):
+        while True:
+            yield
+            if (yield wb.cyc) and (yield wb.stb):
+                for _ in range(latency - 1):
+                    yield
+                nbytes = len(wb.dat_r) // 8
+                adr = (yield wb.adr) * nbytes
+                yield wb.dat_r.eq(self._mem_read(adr, nbytes))
+                yield wb.ack.eq(1)
+                yield
+                yield wb.ack.eq(0)
+                yield
+
+    @passive
+    def _wb_write_slave(self, wb):
+        while True:
+            yield
+            if (yield wb.cyc) and (yield wb.stb):
+                nbytes = len(wb.dat_w) // 8
+                adr = (yield wb.adr) * nbytes
+                slow = self._is_slow(adr)
+                for _ in range(self.config["csr_write_latency" if slow else "wb_write_latency"] - 1):
+                    yield
+                self._mem_write(adr, nbytes, (yield wb.dat_w), (yield wb.sel))
+                yield wb.ack.eq(1)
+                yield
+                yield wb.ack.eq(0)
+                yield
+
+    @passive
+    def _dram_read_port(self):
+        port = self.dut.dram_native_r
+        yield port.cmd.ready.eq(1)
+        while True:
+            yield
+            if (yield port.cmd.valid) and (yield port.cmd.ready):
+                adr = (yield port.cmd.addr) << 4
+                yield port.cmd.ready.eq(0)
+                for _ in range(self.config["dram_read_latency"]):
+                    yield
+                yield port.rdata.data.eq(self._mem_read(adr, 16))
+                yield port.rdata.valid.eq(1)
+                yield
+                while not (yield port.rdata.ready):
+                    yield
+                yield port.rdata.valid.eq(0)
+                yield port.cmd.ready.eq(1)
+
+    @passive
+    def _dram_write_port(self):
+        # commands are queued, the data is taken in order, each dram_write_latency after its command
+        port = self.dut.dram_native_w
+        pending = [] # (address, cycle the data can be taken)
+        cycle = 0
+        yield port.cmd.ready.eq(1)
+        while True:
+            yield
+            cycle += 1
+            if (yield port.cmd.valid) and (yield port.cmd.ready):
+                pending.append(((yield port.cmd.addr) << 4, cycle + self.config["dram_write_latency"]))
+            if (yield port.wdata.valid) and (yield port.wdata.ready):
+                adr, _ = pending.pop(0)
+                self._mem_write(adr, 16, (yield port.wdata.data), (yield port.wdata.we))
+            yield port.cmd.ready.eq(len(pending) < self.config["dram_write_cmds"])
+            yield port.wdata.ready.eq(len(pending) > 0 and (pending[0][1] <= cycle))
+
+    # extra_generators: {domain: [generator]}, e.g. another SDRAM master
+    def run(self, vcd_name=None, extra_generators=None):
+        generators = {
+            "cpu" : [self._cpu_master(), self._wb_read_slave(self.dut.wb_read, self.config["wb_read_latency"]), self._dram_read_port(), self._dram_write_port()],
+            "sys" : [self._wb_write_slave(self.dut.wb_write)] + [self._wb_write_slave(q[1]) for q in self.dut.wb_write_queues],
+        }
+        for domain, gens in (extra_generators or {}).items():
+            generators[domain] = generators.get(domain, []) + gens
+        if (self.dut.declrom_shadow != None):
+            generators["sys"].append(self._wb_read_slave(self.dut.declrom_shadow.bus, self.config["wb_write_latency"]))
+        clocks = { "cpu": self.config["cpu_period_ns"], "sys": self.config["sys_period_ns"] }
+        run_simulation(self.dut, generators, clocks=clocks, vcd_name=vcd_name,
+                       special_overrides={Tristate: self.tristates})
+
+    def report(self):
+        nbytes = sum(t.nbytes() for t in self.txns)
+        time_ns = self.cycles * self.config["cpu_period_ns"]
+        all_latencies = [l for ls in self.latencies.values() for l in ls]
+        def lat_stats(ls):
+            return { "count": len(ls),
+                     "p50": _percentile(ls, 50), "p90": _percentile(ls, 90), "p99": _percentile(ls, 99),
+                     "max": max(ls) if ls else 0 }
+        busy = sum(self.states.values())
+        stalls = { s: c for s, c in sorted(self.states.items()) if s.startswith("Delay") }
+        return {
+            "transactions"   : len(self.txns),
+            "bytes"          : nbytes,
+            "cycles"         : self.cycles,
+            "throughput_MBps": (nbytes * 1000.0 / time_ns) if time_ns else 0.0,
+            "latency"        : lat_stats(all_latencies),
+            "latency_by_kind": { k: lat_stats(v) for k, v in sorted(self.latencies.items()) },
+            "state_cycles"   : dict(sorted(self.states.items())),
+            "stall_cycles"   : sum(stalls.values()),
+            "stall_fraction" : (sum(stalls.values()) / busy) if busy else 0.0,
+            "mismatches"     : self.mismatches,
+            "order_violations": self.order_violations,
+            "burst_counters" : self.burst_counters,
+        }
+
+def replay(txns, config, bridge_args=None, vcd_name=None):
+    r = _Replay(txns, config, bridge_args if (bridge_args != None) else {})
+    r.run(vcd_name=vcd_name)
+    return r.report()
+
+# Synthetic workload corpus -------------------------------------------------------------------------
+
+fb_base  = 0xfe000000 # slot window remapped to the framebuffer
+csr_base = 0xfea00000 # slot window to the CSRs
+scratch_base = 0xfec00000 # slot window to the scratchpad
+superslot_base = 0xe0000000
+
+def _line_write(rnd, adr, gap=0):
+    return Transaction(gap, "W", "16", adr, [rnd.getrandbits(32) for _ in range(4)])
+
+def _gen_finder_drag(rnd, stride=1920*4):
+    # XOR-ed outline of a window being dragged, redrawn at each mouse move
+    txns = []
+    x, y, w, h = 200, 200, 192, 96
+    for move in range(4):
+        for erase in range(2):
+            for row in (y, y + h - 1):
+                for col in range(x, x + w, 8):
+                    adr = fb_base + row * stride + col * 4
+                    adr &= ~0xf
+                    txns.append(Transaction(1, "R", "16", adr, []))
+                    txns.append(_line_write(rnd, adr))
+            for row in range(y, y + h, 16):
+                for col in (x, x + w - 1):
+                    adr = fb_base + row * stride + col * 4
+                    txns.append(Transaction(2, "R", "L", adr, []))
+                    txns.append(Transaction(0, "W", "L", adr, [rnd.getrandbits(32)]))
+        txns.append(Transaction(20, "R", "L", csr_base + 0x800, [])) # VBL polling
+        x += rnd.randint(-8, 8)
+        y += rnd.randint(-8, 8)
+    return txns
+
+def _gen_copybits(rnd, stride=1920*4):
+    # offscreen (superslot) to onscreen copy of a 96x16 32bpp block
+    txns = []
+    for row in range(16):
+        for col in range(0, 96 * 4, 16):
+            txns.append(Transaction(2, "R", "16", superslot_base + 0x100000 + row * 96 * 4 + col, []))
+            txns.append(_line_write(rnd, fb_base + (300 + row) * stride + 400 * 4 + col))
+    return txns
+
+def _gen_text_scroll(rnd, stride=1920):
+    # 8bpp text window scrolling up by one text line, then drawing the new line glyph by glyph
+    txns = []
+    for row in range(12):
+        for col in range(0, 256, 16):
+            txns.append(Transaction(1, "R", "16", fb_base + (112 + row) * stride + col, []))
+            txns.append(_line_write(rnd, fb_base + (100 + row) * stride + col))
+    for glyph in range(8):
+        for row in range(12):
+            adr = fb_base + (112 + row) * stride + glyph * 8
+            txns.append(Transaction(3, "W", "L", adr, [rnd.getrandbits(32)]))
+            txns.append(Transaction(0, "W", "W", adr + 4, [rnd.getrandbits(16)]))
+            txns.append(Transaction(0, "W", "B", adr + 6, [rnd.getrandbits(8)]))
+    return txns
+
+def _gen_quicktime(rnd, stride=1920*2):
+    # 16bpp movie frames pushed from main memory, with audio/VBL status polling
+    txns = []
+    for frame in range(2):
+        for row in range(12):
+            for col in range(0, 160 * 2, 16):
+                txns.append(_line_write(rnd, fb_base + (200 + row) * stride + 304 * 2 + col, gap=4))
+            if (row % 4) == 0:
+                txns.append(Transaction(10, "R", "L", csr_base + 0x1000, []))
+                txns.append(Transaction(2, "W", "L", csr_base + 0x1004, [row]))
+        txns.append(Transaction(30, "R", "L", csr_base + 0x800, []))
+    return txns
+
+def _gen_slot_probe(rnd, rom_top=0xff000000, rom_size=0x800):
+    # Slot Manager walking the declaration ROM byte by byte, then a driver being loaded with long and line reads
+    txns = []
+    for offset in range(1, 21): # format block
+        txns.append(Transaction(6, "R", "B", rom_top - offset, []))
+    for i in range(96): # sResource directories and lists
+        txns.append(Transaction(6, "R", "B", rom_top - rom_size + rnd.randrange(rom_size), []))
+    for offset in range(0, rom_size // 2, 16): # driver
+        txns.append(Transaction(4, "R", "16", rom_top - rom_size + offset, []))
+    for offset in range(0, 256, 4):
+        txns.append(Transaction(2, "R", "L", rom_top - rom_size // 2 + offset, []))
+    return txns
+
+def _gen_accel_batch(rnd, stride=1920*4):
+    # accelerator setup (register writes to a slow target) interleaved with pixel stores, then a status poll
+    txns = []
+    for op in range(6):
+        for reg in range(12):
+            txns.append(Transaction(1, "W", "L", csr_base + 0x2000 + reg * 4, [rnd.getrandbits(32)]))
+        for pixel in range(48):
+            adr = fb_base + (400 + op) * stride + (rnd.randrange(1920) & ~1) * 4
+            txns.append(Transaction(1, "W", "L", adr, [rnd.getrandbits(32)]))
+        txns.append(Transaction(4, "R", "L", csr_base + 0x2000, []))
+    return txns
+
+def _gen_driver_state(rnd, stride=1920*4):
+    # driver bookkeeping next to drawing: ring pointers & a semaphore updated, a small table looked up by lines
+    txns = []
+    for op in range(24):
+        txns.append(Transaction(2, "R", "L", scratch_base + 0x0, [])) # head
+        txns.append(Transaction(1, "R", "L", scratch_base + 0x4, [])) # tail
+        txns.append(Transaction(1, "W", "B", scratch_base + 0x8, [1])) # lock
+        txns.append(Transaction(2, "R", "16", scratch_base + 0x100 + rnd.randrange(16) * 16, []))
+        for pixel in range(4):
+            adr = fb_base + (500 + op) * stride + rnd.randrange(1920) * 4
+            txns.append(Transaction(1, "W", "L", adr, [rnd.getrandbits(32)]))
+        txns.append(Transaction(1, "W", "L", scratch_base + 0x4, [op])) # tail
+        txns.append(Transaction(1, "W", "B", scratch_base + 0x8, [0])) # unlock
+        if (op % 8) == 0:
+            txns.append(Transaction(2, "W", "16", scratch_base + 0x100 + (op // 8) * 16, [rnd.getrandbits(32) for _ in range(4)]))
+    return txns
+
+def _gen_fill(rnd, stride=1920*4):
+    # full-width rectangle fill, lines written back to back (only a band of the screen, to keep the simulation short)
+    txns = []
+    color = rnd.getrandbits(32)
+    for row in range(2):
+        for col in range(0, 1920 * 4, 16):
+            txns.append(Transaction(0, "W", "16", fb_base + (600 + row) * stride + col, [color] * 4))
+    return txns
+
+def _gen_doorbell(rnd, stride=1920*4):
+    # source lines written to the framebuffer, then the accelerator started with a register write (doorbell)
+    # that must not reach it before the lines are in SDRAM
+    txns = []
+    for op in range(8):
+        for row in range(2):
+            for col in range(0, 64, 16):
+                txns.append(_line_write(rnd, fb_base + 0x2000 + (op * 2 + row) * stride + col))
+        txns.append(Transaction(0, "W", "L", csr_base + 0x2000, [op]))
+        txns.append(Transaction(40, "R", "L", csr_base + 0x2004, [])) # status poll
+    return txns
+
+def _gen_move16_copy(rnd, stride=1920*4):
+    # offscreen buffer drawn, then copied with MOVE16 (tt=1) to another offscreen buffer and to the screen,
+    # then shifted by a line in place (overlapping copy), and read back
+    txns = []
+    src = superslot_base + 0x200000
+    dst = superslot_base + 0x300000
+    lines = {}
+    for offset in range(0, 1024, 16):
+        lines[offset] = [rnd.getrandbits(32) for _ in range(4)]
+        txns.append(Transaction(1, "W", "16", src + offset, lines[offset]))
+    for offset in range(0, 1024, 16):
+        txns.append(Transaction(1, "R", "16", src + offset, [], tt=1))
+        txns.append(Transaction(1, "W", "16", dst + offset, lines[offset], tt=1))
+    for row in range(4):
+        for col in range(0, 256, 16):
+            offset = row * 256 + col
+            txns.append(Transaction(1, "R", "16", src + offset, [], tt=1))
+            txns.append(Transaction(1, "W", "16", fb_base + (700 + row) * stride + col, lines[offset], tt=1))
+    for offset in range(1024 - 32, -16, -16): # backwards, the write is to the line read next
+        txns.append(Transaction(1, "R", "16", dst + offset, [], tt=1))
+        txns.append(Transaction(1, "W", "16", dst + offset + 16, lines[offset], tt=1))
+    for offset in range(0, 1024, 64):
+        txns.append(Transaction(2, "R", "16", dst + offset, []))
+    return txns
+
+workloads = {
+    "finder_drag" : _gen_finder_drag,
+    "copybits"    : _gen_copybits,
+    "text_scroll" : _gen_text_scroll,
+    "quicktime"   : _gen_quicktime,
+    "slot_probe"  : _gen_slot_probe,
+    "accel_batch" : _gen_accel_batch,
+    "driver_state": _gen_driver_state,
+    "fill"        : _gen_fill,
+    "move16_copy" : _gen_move16_copy,
+    "doorbell"    : _gen_doorbell,
+}
+
+# Reports -------------------------------------------------------------------------------------------
+
+def print_report(name, r):
+    print(f"{name}: {r['transactions']} transactions, {r['bytes']} bytes in {r['cycles']} cycles, "
+          f"{r['throughput_MBps']:.2f} MB/s, {r['mismatches']} data mismatches, {r['order_violations']} write order violations")
+    print(f"  {'kind':<6} {'count':>6} {'p50':>5} {'p90':>5} {'p99':>5} {'max':>5}")
+    for kind, l in list(r["latency_by_kind"].items()) + [("all", r["latency"])]:
+        print(f"  {kind:<6} {l['count']:>6} {l['p50']:>5} {l['p90']:>5} {l['p99']:>5} {l['max']:>5}")
+    total = sum(r["state_cycles"].values())
+    print(f"  stalls: {r['stall_cycles']} cycles ({100.0 * r['stall_fraction']:.1f}% of busy time)")
+    b = r["burst_counters"]
+    if b["lines"]:
+        print(f"  burst writes (CSRs): {b['lines']} lines, {b['busy']} busy cycles ({16.0 * b['lines'] / b['busy']:.2f} bytes/cycle), {b['cmd_stalls']} command stalls")
+    if "move16_prefetch_hits" in b:
+        print(f"  MOVE16 prefetch (CSR): {b['move16_prefetch_hits']} line reads served from it")
+    for state, c in r["state_cycles"].items():
+        print(f"    {state:<24} {c:>8} {100.0 * c / total:5.1f}%")
+
+# metric name, accessor, True if higher is better
+_compared_metrics = [
+    ("throughput_MBps", lambda r: r["throughput_MBps"], True),
+    ("cycles", lambda r: r["cycles"], False),
+    ("latency p50", lambda r: r["latency"]["p50"], False),
+    ("latency p90", lambda r: r["latency"]["p90"], False),
+    ("latency p99", lambda r: r["latency"]["p99"], False),
+    ("stall_cycles", lambda r: r["stall_cycles"], False),
+    ("mismatches", lambda r: r["mismatches"], False),
+    ("order_violations", lambda r: r.get("order_violations", 0), False),
+]
+
+def compare_reports(base, new, threshold):
+    regressions = 0
+    for name in sorted(set(base["traces"]) & set(new["traces"])):
+        print(f"{name}:")
+        b, n = base["traces"][name], new["traces"][name]
+        for metric, get, higher_is_better in _compared_metrics:
+            vb, vn = get(b), get(n)
+            change = ((vn - vb) * 100.0 / vb) if vb else (0.0 if vn == vb else float("inf"))
+            worse = (-change if higher_is_better else change) > threshold
+            better = (change if higher_is_better else -change) > threshold
+            flag = "REGRESSION" if worse else ("improved" if better else "")
+            regressions += 1 if worse else 0
+            print(f"  {metric:<16} {vb:>12.2f} {vn:>12.2f} {change:>+8.1f}%  {flag}")
+    for name in sorted(set(base["traces"]) ^ set(new["traces"])):
+        print(f"{name}: only in one of the reports, skipped")
+    return regressions
+
+def _parse_settings(settings):
+    config = dict(default_config)
+    bridge_args = {}
+    for s in settings:
+        key, value = s.split("=", 1)
+        value = json.loads(value) if value not in ("True", "False") else (value == "True")
+        if key.startswith("bridge."):
+            bridge_args[key[len("bridge."):]] = value
+        elif key in config:
+            config[key] = value
+        else:
+            raise ValueError(f"unknown setting '{key}'")
+    return config, bridge_args
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay 68040 bus traces into the PDS040 bridge simulation")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    gen = sub.add_parser("generate", help="Generate the synthetic workload traces")
+    gen.add_argument("--out-dir", default="traces/synthetic", help="Output directory (default traces/synthetic)")
+    gen.add_argument("--seed", type=int, default=0x68040, help="Random seed")
+
+    run = sub.add_parser("run", help="Replay traces and report")
+    run.add_argument("traces", nargs="+", help="Trace files")
+    run.add_argument("--set", action="append", default=[], metavar="KEY=VALUE",
+                     help="Override a simulation setting (" + ", ".join(default_config) + "), or pass bridge.<arg>=<value> to MC68040_FSM")
+    run.add_argument("--json", help="Write the report to this JSON file")
+    run.add_argument("--vcd", help="Dump a VCD of the last trace")
+
+    cmp = sub.add_parser("compare", help="Compare two JSON reports, flag regressions")
+    cmp.add_argument("base")
+    cmp.add_argument("new")
+    cmp.add_argument("--threshold", type=float, default=2.0, help="Percent change considered significant (default 2)")
+
+    args = parser.parse_args()
+
+    if (args.command == "generate"):
+        os.makedirs(args.out_dir, exist_ok=True)
+        for name, gen_func in workloads.items():
+            rnd = random.Random(args.seed)
+            with open(os.path.join(args.out_dir, name + ".trace"), "w") as f:
+                f.write(f"# {name}: synthetic workload, generated by bridge_replay.py (seed {args.seed:#x})\n")
+                for txn in gen_func(rnd):
+                    f.write(str(txn) + "\n")
+    elif (args.command == "run"):
+        config, bridge_args = _parse_settings(args.set)
+        result = { "config": config, "bridge": bridge_args, "traces": {} }
+        for i, filename in enumerate(args.traces):
+            name = os.path.splitext(os.path.basename(filename))[0]
+            vcd = args.vcd if (i == len(args.traces) - 1) else None
+            r = replay(load_trace(filename), config, bridge_args, vcd_name=vcd)
+            result["traces"][name] = r
+            print_report(name, r)
+        if (args.json):
+            with open(args.json, "w") as f:
+                json.dump(result, f, indent=2)
+    elif (args.command == "compare"):
+        with open(args.base) as f:
+            base = json.load(f)
+        with open(args.new) as f:
+            new = json.load(f)
+        regressions = compare_reports(base, new, args.threshold)
+        print(f"{regressions} regression(s) above {args.threshold}%")
+        sys.exit(1 if regressions else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,238 @@
+#!/usr/bin/env python3
+#
+# Build report for pds040_to_fpga_soc.py: wall time per build stage, peak memory, and the Vivado
+# phase times, utilization and per-clock slack parsed from the logs/reports in the gateware directory.
+#
+# pds040_to_fpga_soc.py writes <gateware dir>/<platform name>_build_report.json at the end of each run
+# (the Vivado part is only there after a --build).
+#
+# Usage:
+#   python3 build_report.py parse build/ztex213_pds040_V1_0/gateware ztex213_pds040_V1_0
+#   python3 build_report.py compare base.json new.json
+#
+
+import os
+import re
+import sys
+import json
+import time
+import argparse
+import resource
+
+# Vivado clock names (from the create_generated_clock/create_clock in the CRG) -> domain
+clock_domains = {
+    "sysclk"    : "sys",
+    "cpu_clk"   : "cpu",
+    "hdmi_clk"  : "hdmi",
+    "idelayclk" : "idelay",
+}
+
+# utilization rows kept in the report
+utilization_sites = [
+    "Slice LUTs",
+    "Slice Registers",
+    "Block RAM Tile",
+    "DSPs",
+    "Bonded IOB",
+    "MMCME2_ADV",
+    "BUFGCTRL",
+]
+
+# Stage timing -------------------------------------------------------------------------------------
+
+class BuildReport:
+    def __init__(self):
+        self.report = { "argv": sys.argv[1:], "stages": {} }
+
+    def stage(self, name):
+        return _Stage(self.report["stages"], name)
+
+    def finish(self, gateware_dir, build_name):
+        self.report["peak_rss_MB"] = {
+            # ru_maxrss is in KiB on Linux
+            "self": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0,
+            "children": resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024.0, # Vivado
+        }
+        self.report.update(parse_gateware_dir(gateware_dir, build_name))
+        filename = os.path.join(gateware_dir, build_name + "_build_report.json")
+        with open(filename, "w") as f:
+            json.dump(self.report, f, indent=2)
+        return filename
+
+class _Stage:
+    def __init__(self, stages, name):
+        self.stages = stages
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.monotonic()
+
+    def __exit__(self, *exc):
+        self.stages[self.name] = time.monotonic() - self.start
+
+# Parsers ------------------------------------------------------------------------------------------
+
+def _hms(h, m, s):
+    return int(h) * 3600 + int(m) * 60 + int(s)
+
+# e.g. "route_design: Time (s): cpu = 00:01:02 ; elapsed = 00:00:48 . Memory (MB): peak = 2873.215 ; gain = 0.000"
+_vivado_time_re = re.compile(r"^(\w+): Time \(s\): cpu = (\d+):(\d+):(\d+) ; elapsed = (\d+):(\d+):(\d+) \. Memory \(MB\): peak = ([\d.]+)")
+
+def parse_vivado_log(lines):
+    phases = {}
+    for line in lines:
+        m = _vivado_time_re.match(line)
+        if m is None:
+            continue
+        phase = phases.setdefault(m.group(1), { "cpu_s": 0, "elapsed_s": 0, "peak_MB": 0.0 })
+        phase["cpu_s"] += _hms(*m.group(2, 3, 4))
+        phase["elapsed_s"] += _hms(*m.group(5, 6, 7))
+        phase["peak_MB"] = max(phase["peak_MB"], float(m.group(8)))
+    return phases
+
+def _table_cells(line):
+    return [c.strip() for c in line.strip().strip("|").split("|")]
+
+def parse_utilization(lines):
+    # tables are "| Site Type | Used | Fixed | [Prohibited |] Available | Util% |", first occurrence of a site wins
+    utilization = {}
+    header = None
+    for line in lines:
+        if not line.startswith("|"):
+            if not line.startswith("+"):
+                header = None
+            continue
+        cells = _table_cells(line)
+        if (cells[0] == "Site Type"):
+            header = cells
+            continue
+        site = cells[0].rstrip("*")
+        if (header is None) or (len(cells) != len(header)) or (site not in utilization_sites) or (site in utilization):
+            continue
+        row = dict(zip(header, cells))
+        try:
+            utilization[site] = {
+                "used": float(row["Used"]), # half Block RAM Tiles
+                "available": int(row["Available"]),
+                "util_pct": float(row["Util%"].lstrip("<")),
+            }
+        except (KeyError, ValueError):
+            pass
+    return utilization
+
+def parse_timing_summary(lines):
+    # "Intra Clock Table" of report_timing_summary, values are right-aligned under the column names
+    # (Clock WNS(ns) TNS(ns) ... WHS(ns) ...), clocks without setup paths have empty columns and are skipped
+    timing = {}
+    in_table = False
+    columns = None
+    for line in lines:
+        if ("Clock Table" in line):
+            if in_table:
+                break # next table
+            in_table = ("Intra Clock Table" in line)
+            continue
+        if not in_table:
+            continue
+        if (columns is None):
+            if line.startswith("Clock ") and ("WNS(ns)" in line):
+                columns = { m.end(): m.group(0) for m in re.finditer(r"\S+(?: \S+)*", line) }
+            continue
+        words = list(re.finditer(r"\S+", line))
+        if (len(words) < 2) or words[0].group(0).startswith("-"):
+            continue
+        values = { columns[w.end()]: w.group(0) for w in words[1:] if w.end() in columns }
+        if ("WNS(ns)" not in values):
+            continue
+        try:
+            timing[words[0].group(0)] = { "wns_ns": float(values["WNS(ns)"]),
+                                          "tns_ns": float(values.get("TNS(ns)", "nan")),
+                                          "whs_ns": float(values.get("WHS(ns)", "nan")) }
+        except ValueError:
+            continue
+    return timing
+
+def parse_gateware_dir(gateware_dir, build_name):
+    r = {}
+    def lines_of(filename):
+        path = os.path.join(gateware_dir, filename)
+        if not os.path.exists(path):
+            return None
+        with open(path, errors="replace") as f:
+            return f.readlines()
+    log = lines_of("vivado.log")
+    if (log is not None):
+        r["vivado_phases"] = parse_vivado_log(log)
+    util = lines_of(build_name + "_utilization_place.rpt")
+    if (util is not None):
+        r["utilization"] = parse_utilization(util)
+    timing = lines_of(build_name + "_timing.rpt")
+    if (timing is not None):
+        clocks = parse_timing_summary(timing)
+        r["timing"] = clocks
+        r["wns_ns"] = { domain: clocks[clock]["wns_ns"] for clock, domain in clock_domains.items() if clock in clocks }
+    return r
+
+# Comparison ---------------------------------------------------------------------------------------
+
+def compare_reports(base, new):
+    # returns the number of clock domains that went from met to failed timing
+    def row(name, vb, vn, unit, flag=""):
+        if (vb is None) or (vn is None):
+            print(f"  {name:<20} {str(vb):>12} {str(vn):>12}")
+        else:
+            print(f"  {name:<20} {vb:>12.2f} {vn:>12.2f} {vn - vb:>+10.2f} {unit:<3} {flag}")
+
+    print("stages (s):")
+    for stage in list(base["stages"]) + [s for s in new["stages"] if s not in base["stages"]]:
+        row(stage, base["stages"].get(stage), new["stages"].get(stage), "s")
+    print("vivado phases (elapsed s):")
+    bp, np = base.get("vivado_phases", {}), new.get("vivado_phases", {})
+    for phase in list(bp) + [p for p in np if p not in bp]:
+        row(phase, bp.get(phase, {}).get("elapsed_s"), np.get(phase, {}).get("elapsed_s"), "s")
+    print("peak memory (MB):")
+    for who in ("self", "children"):
+        row(who, base["peak_rss_MB"][who], new["peak_rss_MB"][who], "MB")
+    print("utilization (used):")
+    bu, nu = base.get("utilization", {}), new.get("utilization", {})
+    for site in utilization_sites:
+        if (site in bu) or (site in nu):
+            row(site, bu.get(site, {}).get("used"), nu.get(site, {}).get("used"), "")
+    print("worst setup slack (ns):")
+    failures = 0
+    bw, nw = base.get("wns_ns", {}), new.get("wns_ns", {})
+    for domain in clock_domains.values():
+        if (domain in bw) or (domain in nw):
+            vb, vn = bw.get(domain), nw.get(domain)
+            failing = (vn is not None) and (vn < 0) and ((vb is None) or (vb >= 0))
+            failures += 1 if failing else 0
+            row(domain, vb, vn, "ns", "FAILING" if failing else "")
+    return failures
+
+def main():
+    parser = argparse.ArgumentParser(description="QuadraFPGA build reports")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    parse = sub.add_parser("parse", help="Parse the Vivado log & reports of a gateware directory")
+    parse.add_argument("gateware_dir")
+    parse.add_argument("build_name", help="e.g. ztex213_pds040_V1_0")
+
+    cmp = sub.add_parser("compare", help="Compare two JSON build reports")
+    cmp.add_argument("base")
+    cmp.add_argument("new")
+
+    args = parser.parse_args()
+
+    if (args.command == "parse"):
+        print(json.dumps(parse_gateware_dir(args.gateware_dir, args.build_name), indent=2))
+    elif (args.command == "compare"):
+        with open(args.base) as f:
+            base = json.load(f)
+        with open(args.new) as f:
+            new = json.load(f)
+        failures = compare_reports(base, new)
+        print(f"{failures} clock domain(s) newly failing timing")
+        sys.exit(1 if failures else 0)
+
+if __name__ == "__main__":
+    main()
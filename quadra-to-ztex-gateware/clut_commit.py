@@ -0,0 +1,128 @@
+from migen import *
+
+from litex.soc.interconnect import wishbone
+from litex.soc.interconnect.csr import *
+
+# CLUT/gamma staging buffer, written by the host with line bursts (one 0x00RRGGBB long word per entry),
+# and copied to the palette registers at the next VBL after a 'commit', so a whole palette change is a
+# few bursts and one register write, and never shows half-updated
+# The copy is a sequence of wishbone writes:
+# - preamble: 'first' written to 'index_reg' (skipped if 0), e.g. a RAMDAC-style address register
+# - for each entry from 'first', to 'data_reg' + n * 'stride' (stride 0 for an auto-incrementing data
+#   register), either the long word, or with 'split' set its R, G & B as three successive writes
+# vbl_n is active-low in the sys domain, its new assertions are the VBLs
+class CLUTCommit(Module, AutoCSR):
+    def __init__(self, vbl_n, entries = 256):
+        self.bus = bus = wishbone.Interface(data_width=32) # slave, staging buffer
+        self.master = master = wishbone.Interface(data_width=32) # master, writes the palette registers
+
+        self.ctrl = CSRStorage(fields=[CSRField("enable", size=1, description="Copy at VBL (set the registers first)"),
+                                       CSRField("split", size=1, description="Write each entry as R, G, B")])
+        self.index_reg = CSRStorage(32, reset = 0, description="Wishbone byte address of the index register (0 = none)")
+        self.data_reg = CSRStorage(32, reset = 0, description="Wishbone byte address of the first data register")
+        self.stride = CSRStorage(16, reset = 0, description="Bytes between the data registers of consecutive entries")
+        self.range = CSRStorage(fields=[CSRField("first", size=8, description="First entry copied"),
+                                        CSRField("count", size=9, reset=entries, description="Number of entries copied")])
+        self.commit = CSR() # write arms the copy
+        self.status = CSRStatus(fields=[CSRField("pending", size=1, description="A copy is waiting for VBL")])
+        self.commits = CSRStatus(32, description="Completed copies")
+
+        # staging buffer
+        self.specials.mem = Memory(32, entries)
+        bus_port = self.mem.get_port(write_capable=True, we_granularity=8)
+        rd_port = self.mem.get_port()
+        self.specials += bus_port, rd_port
+        self.comb += [
+            bus_port.adr.eq(bus.adr[0:log2_int(entries)]),
+            bus_port.dat_w.eq(bus.dat_w),
+            bus_port.we.eq(Replicate(bus.cyc & bus.stb & bus.we & ~bus.ack, 4) & bus.sel),
+            bus.dat_r.eq(bus_port.dat_r),
+        ]
+        self.sync += [
+            bus.ack.eq(bus.cyc & bus.stb & ~bus.ack),
+        ]
+
+        pending = Signal()
+        prev_vbl_n = Signal(reset = 1)
+        vbl = Signal()
+        done = Signal()
+        self.comb += [
+            vbl.eq(prev_vbl_n & ~vbl_n),
+            self.status.fields.pending.eq(pending),
+        ]
+        self.sync += [
+            prev_vbl_n.eq(vbl_n),
+            If(self.commit.re,
+               pending.eq(1),
+            ).Elif(done,
+               pending.eq(0),
+            ),
+        ]
+
+        index = Signal(log2_int(entries))
+        left = Signal(max=entries + 1)
+        adr = Signal(32)
+        entry = Signal(32)
+        component = Signal(2) # 0 R, 1 G, 2 B
+        self.submodules.fsm = fsm = FSM(reset_state="Idle")
+        self.comb += [
+            rd_port.adr.eq(index),
+            master.adr.eq(adr[2:32]),
+            master.sel.eq(0xf),
+            master.we.eq(1),
+            If(self.ctrl.fields.split & ~fsm.ongoing("Preamble"), # the index is not split
+               master.dat_w.eq(Array([entry[16:24], entry[8:16], entry[0:8]])[component]),
+            ).Else(
+               master.dat_w.eq(entry),
+            ),
+        ]
+        fsm.act("Idle",
+                NextValue(index, self.range.fields.first),
+                NextValue(left, self.range.fields.count),
+                If(self.ctrl.fields.enable & pending & vbl,
+                   If(self.index_reg.storage != 0,
+                      NextValue(adr, self.index_reg.storage),
+                      NextValue(entry, self.range.fields.first),
+                      NextState("Preamble"),
+                   ).Else(
+                      NextValue(adr, self.data_reg.storage),
+                      NextState("Fetch"),
+                   ),
+                ),
+        )
+        fsm.act("Preamble",
+                master.cyc.eq(1),
+                master.stb.eq(1),
+                If(master.ack,
+                   NextValue(adr, self.data_reg.storage),
+                   NextState("Fetch"),
+                ),
+        )
+        fsm.act("Fetch", # block RAM latency
+                NextValue(component, 0),
+                If(left == 0,
+                   done.eq(1),
+                   NextValue(self.commits.status, self.commits.status + 1),
+                   NextState("Idle"),
+                ).Else(
+                   NextState("Load"),
+                ),
+        )
+        fsm.act("Load",
+                NextValue(entry, rd_port.dat_r),
+                NextState("Write"),
+        )
+        fsm.act("Write",
+                master.cyc.eq(1),
+                master.stb.eq(1),
+                If(master.ack,
+                   If(self.ctrl.fields.split & (component != 2),
+                      NextValue(component, component + 1),
+                   ).Else(
+                      NextValue(adr, adr + self.stride.storage),
+                      NextValue(index, index + 1),
+                      NextValue(left, left - 1),
+                      NextState("Fetch"),
+                   ),
+                ),
+        )
@@ -0,0 +1,118 @@
+from migen import *
+
+from litex.soc.interconnect import wishbone
+from litex.soc.interconnect.csr import *
+
+# Command ring in SDRAM, fetched through a native read port and executed on wishbone (in the sys domain)
+# so the host can queue accelerator register writes with line-burst writes instead of one CSR write each
+# Entries are 16 bytes, four 32 bits little-endian words (like the CSRs, so swapped unless in a native endian window):
+# - word 0: opcode in bits 7:0, for FENCE bit 8 raises an interrupt
+# - word 1: wishbone byte address (WRITE, WAIT)
+# - word 2: data (WRITE), expected value (WAIT), fence value (FENCE)
+# - word 3: mask (WAIT)
+# The host writes entries at 'head', then writes the new 'head' (doorbell); the engine executes from 'tail'
+# up to 'head'. Entries are posted writes in the bridge, while the doorbell is a CSR write on another path,
+# so the host must read back the last entry it wrote before ringing the doorbell
+class CmdRing(Module, AutoCSR):
+    OP_NOP = 0
+    OP_WRITE = 1 # write data to address
+    OP_WAIT = 2  # poll address until (value & mask) == data
+    OP_FENCE = 3 # set 'fence' to data, and 'fence_time' to the current timestamp
+
+    def __init__(self, port, base = 0x8fff1000):
+        self.bus = bus = wishbone.Interface(data_width=32) # master, executes the commands
+        self.irq = Signal() # one cycle pulse, FENCE with bit 8 set
+
+        self.base = CSRStorage(32, reset = base, description="SDRAM byte address of the ring (16 bytes aligned)")
+        self.size = CSRStorage(5, reset = 8, description="Log2 of the number of entries (at most 16, larger values are taken as 16)")
+        self.head = CSRStorage(16, description="Producer index, written by the host (doorbell)")
+        self.tail = CSRStatus(16, description="Consumer index, next entry to execute")
+        self.fence = CSRStatus(32, description="Data of the last executed FENCE")
+        self.fence_time = CSRStatus(32, description="Timestamp of the last executed FENCE")
+        self.timestamp = CSRStatus(32, description="Free-running cycle counter")
+        self.ctrl = CSRStorage(fields=[
+            CSRField("enable", size=1, description="Fetch & execute commands"),
+            CSRField("reset", size=1, pulse=True, description="Set 'tail' to 0 (while disabled)"),
+        ])
+
+        tail = Signal(16)
+        mask = Signal(16)
+        opcode = Signal(8)
+        flags = Signal(8)
+        address = Signal(32)
+        data = Signal(32)
+        data_mask = Signal(32)
+        self.comb += [
+            mask.eq(Array([(2**min(i, 16))-1 for i in range(2**len(self.size.storage))])[self.size.storage]), # 17-31 clamped to 16
+            self.tail.status.eq(tail),
+        ]
+        self.sync += self.timestamp.status.eq(self.timestamp.status + 1)
+
+        self.comb += [
+            port.cmd.we.eq(0),
+            port.cmd.addr.eq(self.base.storage[4:] + tail),
+            bus.adr.eq(address[2:]),
+            bus.dat_w.eq(data),
+            bus.sel.eq(0xf),
+        ]
+
+        self.submodules.fsm = fsm = FSM(reset_state="Idle")
+        fsm.act("Idle",
+                If(~self.ctrl.fields.enable,
+                   If(self.ctrl.fields.reset,
+                      NextValue(tail, 0),
+                   ),
+                ).Elif(tail != (self.head.storage & mask),
+                   NextState("FetchCmd"),
+                ),
+        )
+        fsm.act("FetchCmd",
+                port.cmd.valid.eq(1),
+                If(port.cmd.ready,
+                   NextState("FetchData"),
+                ),
+        )
+        fsm.act("FetchData",
+                port.rdata.ready.eq(1),
+                If(port.rdata.valid,
+                   NextValue(opcode, port.rdata.data[0:8]),
+                   NextValue(flags, port.rdata.data[8:16]),
+                   NextValue(address, port.rdata.data[32:64]),
+                   NextValue(data, port.rdata.data[64:96]),
+                   NextValue(data_mask, port.rdata.data[96:128]),
+                   NextState("Execute"),
+                ),
+        )
+        fsm.act("Execute",
+                Case(opcode, {
+                    self.OP_WRITE: [ NextState("BusWrite") ],
+                    self.OP_WAIT: [ NextState("BusRead") ],
+                    self.OP_FENCE: [ NextValue(self.fence.status, data),
+                                     NextValue(self.fence_time.status, self.timestamp.status),
+                                     self.irq.eq(flags[0]),
+                                     NextState("Next") ],
+                    "default": [ NextState("Next") ], # NOP, unknown
+                }),
+        )
+        fsm.act("BusWrite",
+                bus.cyc.eq(1),
+                bus.stb.eq(1),
+                bus.we.eq(1),
+                If(bus.ack,
+                   NextState("Next"),
+                ),
+        )
+        fsm.act("BusRead",
+                bus.cyc.eq(1),
+                bus.stb.eq(1),
+                bus.we.eq(0),
+                If(bus.ack,
+                   If((bus.dat_r & data_mask) == data,
+                      NextState("Next"),
+                   ), # else read again
+                ),
+        )
+        fsm.act("Next",
+                NextValue(tail, (tail + 1) & mask),
+                NextState("Idle"),
+        )
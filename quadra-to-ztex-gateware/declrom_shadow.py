@@ -0,0 +1,64 @@
+from migen import *
+from migen.genlib.cdc import *
+
+from litex.soc.interconnect import wishbone
+from litex.soc.interconnect.csr import *
+
+# Copy of the declaration ROM in block RAM, so the bridge can serve it from the cpu clock domain
+# The copy is made through wishbone after reset (or when 'reload' is written, e.g. after updating
+# the ROM in the config flash), the bridge falls back to the regular wishbone path until it's done
+class DeclROMShadow(Module, AutoCSR):
+    def __init__(self, rom_base, rom_size, cd_cpu="cpu"):
+        # rom_base is the wishbone byte address of the declaration ROM
+        self.rom_base = rom_base
+        self.rom_size = rom_size
+        words = rom_size // 4
+
+        self.bus = bus = wishbone.Interface(data_width=32) # master, reads the ROM
+
+        self.status = CSRStatus(fields=[CSRField("done", size=1, description="Shadow copy complete, served by the bridge")])
+        self.reload = CSRStorage(fields=[CSRField("reload", size=1, pulse=True, description="Copy the ROM again")])
+
+        self.specials.mem = Memory(32, words)
+        wr_port = self.mem.get_port(write_capable=True)
+        self.rd_port = rd_port = self.mem.get_port(clock_domain=cd_cpu) # for the bridge, 1 cycle latency
+        self.specials += wr_port, rd_port
+
+        # sys domain copy
+        done_sys = Signal()
+        index = Signal(log2_int(words))
+        self.submodules.fill_fsm = fill_fsm = FSM(reset_state="Reset")
+        fill_fsm.act("Reset",
+                     NextValue(index, 0),
+                     NextValue(done_sys, 0),
+                     NextState("Read"),
+        )
+        fill_fsm.act("Read",
+                     bus.cyc.eq(1),
+                     bus.stb.eq(1),
+                     bus.we.eq(0),
+                     bus.sel.eq(0xf),
+                     bus.adr.eq((rom_base >> 2) + index),
+                     If(bus.ack,
+                        wr_port.we.eq(1),
+                        NextValue(index, index + 1),
+                        If(index == (words - 1),
+                           NextValue(done_sys, 1),
+                           NextState("Done"),
+                        ),
+                     ),
+        )
+        fill_fsm.act("Done",
+                     If(self.reload.fields.reload,
+                        NextState("Reset"),
+                     ),
+        )
+        self.comb += [
+            wr_port.adr.eq(index),
+            wr_port.dat_w.eq(bus.dat_r),
+            self.status.fields.done.eq(done_sys),
+        ]
+
+        # for the bridge
+        self.done = Signal()
+        self.specials += MultiReg(done_sys, self.done, odomain=cd_cpu)
@@ -0,0 +1,45 @@
+from migen import *
+
+from litex.soc.interconnect.csr import *
+
+from litedram.frontend.bist import LiteDRAMBISTGenerator, LiteDRAMBISTChecker
+
+# SDRAM bandwidth/latency benchmark, running alongside scanout & bridge traffic
+# - generator (writes) and checker (reads) are LiteDRAM's BIST, on their own crossbar ports: base/end/length
+#   (bytes), random data/address, ticks; start one, the other or both for a read/write mix
+#   (bandwidth is length / ticks)
+# - latency probe on the checker port: reads issued & completed, and the sum over cycles of the reads in
+#   flight, so the average read latency is outstanding_sum / reads_done (Little's law), plus the peak in flight
+class DRAMBench(Module, AutoCSR):
+    def __init__(self, write_port, read_port):
+        assert(read_port.clock_domain == "sys")
+        self.submodules.generator = LiteDRAMBISTGenerator(write_port)
+        self.submodules.checker = LiteDRAMBISTChecker(read_port)
+
+        self.probe_clear = CSRStorage(fields=[CSRField("clear", size=1, pulse=True, description="Clear the probe counters")])
+        self.reads_issued = CSRStatus(32, description="Read commands accepted")
+        self.reads_done = CSRStatus(32, description="Read data received")
+        self.outstanding_sum = CSRStatus(64, description="Sum over cycles of the reads in flight")
+        self.outstanding_max = CSRStatus(16, description="Peak reads in flight")
+
+        issued = Signal()
+        done = Signal()
+        outstanding = Signal(16)
+        self.comb += [
+            issued.eq(read_port.cmd.valid & read_port.cmd.ready & ~read_port.cmd.we),
+            done.eq(read_port.rdata.valid & read_port.rdata.ready),
+        ]
+        self.sync += [
+            If(self.probe_clear.fields.clear,
+               self.reads_issued.status.eq(0),
+               self.reads_done.status.eq(0),
+               self.outstanding_sum.status.eq(0),
+               self.outstanding_max.status.eq(0),
+            ).Else(
+                If(issued, self.reads_issued.status.eq(self.reads_issued.status + 1)),
+                If(done, self.reads_done.status.eq(self.reads_done.status + 1)),
+                self.outstanding_sum.status.eq(self.outstanding_sum.status + outstanding),
+                If(outstanding > self.outstanding_max.status, self.outstanding_max.status.eq(outstanding)),
+            ),
+            outstanding.eq(outstanding + issued - done),
+        ]
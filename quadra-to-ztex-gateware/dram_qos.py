@@ -0,0 +1,87 @@
+from migen import *
+from migen.genlib.cdc import *
+
+from litex.soc.interconnect.csr import *
+
+from litedram.common import LiteDRAMNativePort
+
+# Bandwidth cap & counters in front of a LiteDRAM crossbar port, the user side is a port of the same kind in
+# the same clock domain
+# - bandwidth cap: token bucket, one command token every 'cap_period' cycles (0 = no cap), at most 'cap_burst' saved
+# - counters: commands, cycles with a command refused by the port and cycles held back by the cap
+# For a port in another clock domain than the controller (e.g. the bridge's, in cpu), the port is the crossbar's
+# clock domain crossing, so 'refused' is back-pressure from its FIFO: it includes, but doesn't isolate, the
+# controller's own stalls (refresh, bank conflicts, other ports)
+# There's no scanout deadline protection: Goblin's line buffer level isn't exported (VintageBusFPGA_Common)
+class DRAMPortQoS(Module, AutoCSR):
+    def __init__(self, port):
+        cd = port.clock_domain
+        sync_cd = getattr(self.sync, cd)
+
+        self.user_port = user_port = LiteDRAMNativePort(port.mode, port.address_width, port.data_width, clock_domain=cd)
+
+        self.cap_period = CSRStorage(16, reset = 0, description="Cycles per command token, 0 disables the cap")
+        self.cap_burst = CSRStorage(8, reset = 8, description="Maximum saved command tokens")
+        self.commands = CSRStatus(32, description="Commands issued")
+        self.refused_cycles = CSRStatus(32, description="Cycles with a command refused by the port (clock domain crossing FIFO full)")
+        self.hold_cycles = CSRStatus(32, description="Cycles with a command held back by the cap")
+
+        # settings, to the port clock domain
+        cap_period_cd = Signal(16)
+        cap_burst_cd = Signal(8)
+        self.specials += [
+            MultiReg(self.cap_period.storage, cap_period_cd, odomain=cd),
+            MultiReg(self.cap_burst.storage, cap_burst_cd, odomain=cd),
+        ]
+
+        tokens = Signal(8)
+        period_ctr = Signal(16)
+        refill = Signal()
+        hold = Signal()
+        self.comb += [
+            refill.eq((cap_period_cd != 0) & (period_ctr >= (cap_period_cd - 1))),
+            hold.eq((cap_period_cd != 0) & (tokens == 0)),
+        ]
+
+        self.comb += [
+            user_port.cmd.connect(port.cmd, omit={"valid", "ready"}),
+            port.cmd.valid.eq(user_port.cmd.valid & ~hold),
+            user_port.cmd.ready.eq(port.cmd.ready & ~hold),
+            user_port.wdata.connect(port.wdata),
+            port.rdata.connect(user_port.rdata),
+            port.flush.eq(user_port.flush),
+            user_port.lock.eq(port.lock),
+        ]
+
+        sync_cd += [
+            If(cap_period_cd == 0,
+               period_ctr.eq(0),
+               tokens.eq(cap_burst_cd),
+            ).Else(
+                If(refill,
+                   period_ctr.eq(0),
+                ).Else(
+                    period_ctr.eq(period_ctr + 1),
+                ),
+                If(refill & ~(port.cmd.valid & port.cmd.ready),
+                   If(tokens < cap_burst_cd,
+                      tokens.eq(tokens + 1),
+                   ),
+                ).Elif(~refill & (port.cmd.valid & port.cmd.ready),
+                    tokens.eq(tokens - 1),
+                ),
+            )
+        ]
+
+        # counters, to the sys domain
+        for counter, event in [(self.commands, port.cmd.valid & port.cmd.ready),
+                               (self.refused_cycles, port.cmd.valid & ~port.cmd.ready),
+                               (self.hold_cycles, user_port.cmd.valid & hold)]:
+            value = Signal(32)
+            sync_cd += If(event, value.eq(value + 1))
+            sync = BusSynchronizer(32, idomain = cd, odomain = "sys")
+            self.submodules += sync
+            self.comb += [
+                sync.i.eq(value),
+                counter.status.eq(sync.o),
+            ]
@@ -0,0 +1,113 @@
+from migen import *
+from migen.genlib.cdc import MultiReg, PulseSynchronizer
+
+from litex.soc.interconnect.csr import *
+
+# Per-page access counters, to see which pages of the card & Mac windows the 68040 actually touches
+# Every transaction start (TS) seen by the bridge in one of the windows bumps the saturating read or write
+# counter of its page; the table is in block RAM, updated read-modify-write in the cpu domain (TS are at
+# least two cycles apart, so an update is always written back before the next read)
+# The host reads the table an entry at a time through 'index'/'data' (heatmap_report.py decodes a dump)
+# windows: list of (name, base, size, page_size) in 68040 address space, entries in that order
+
+# slot $E (direct & framebuffer), superslot $E, and Mac RAM, plus the (disabled) card memory window: 1024 entries
+default_windows = [
+    ("slot",      0xFE000000, 0x01000000, 0x10000),
+    ("superslot", 0xE0000000, 0x10000000, 0x100000),
+    ("ram",       0x00000000, 0x10000000, 0x100000),
+    ("mem",       0x30000000, 0x10000000, 0x100000),
+]
+
+class AccessHeatmap(Module, AutoCSR):
+    def __init__(self, windows, cd_cpu="cpu"):
+        self.windows = windows
+        entries = sum(size // page_size for (name, base, size, page_size) in windows)
+        index_bits = bits_for(entries - 1)
+
+        # from the bridge, cpu domain
+        self.access = Signal() # TS
+        self.address = Signal(32)
+        self.write = Signal()
+
+        self.ctrl = CSRStorage(fields=[CSRField("enable", size=1, description="Count accesses"),
+                                       CSRField("clear", size=1, pulse=True, description="Zero the table")])
+        self.status = CSRStatus(fields=[CSRField("entries", size=16, description="Number of pages in the table")])
+        self.index = CSRStorage(16, description="Entry read in 'data'")
+        self.data = CSRStatus(fields=[CSRField("reads", size=16, description="Reads of the page (saturating)"),
+                                      CSRField("writes", size=16, description="Writes to the page (saturating)")])
+        self.comb += self.status.fields.entries.eq(entries)
+
+        self.specials.mem = Memory(32, entries)
+        cpu_port = self.mem.get_port(write_capable=True, clock_domain=cd_cpu)
+        sys_port = self.mem.get_port()
+        self.specials += cpu_port, sys_port
+
+        self.comb += [
+            sys_port.adr.eq(self.index.storage),
+            self.data.fields.reads.eq(sys_port.dat_r[0:16]),
+            self.data.fields.writes.eq(sys_port.dat_r[16:32]),
+        ]
+
+        cpu_sync = getattr(self.sync, cd_cpu)
+
+        enable = Signal()
+        self.specials += MultiReg(self.ctrl.fields.enable, enable, cd_cpu)
+        self.submodules.clear_ps = PulseSynchronizer("sys", cd_cpu)
+        self.comb += self.clear_ps.i.eq(self.ctrl.fields.clear)
+
+        # page lookup
+        hit = Signal()
+        page = Signal(index_bits)
+        cases = [ hit.eq(0) ]
+        first = sum(size // page_size for (name, base, size, page_size) in windows)
+        for (name, base, size, page_size) in reversed(windows):
+            assert(((size & (size - 1)) == 0) and ((base & (size - 1)) == 0) and ((page_size & (page_size - 1)) == 0))
+            first -= size // page_size
+            bits = log2_int(size)
+            cases = [ If(self.address[bits:32] == (base >> bits),
+                         hit.eq(1),
+                         page.eq(first + self.address[log2_int(page_size):bits]),
+                      ).Else(*cases) ]
+        self.comb += cases
+
+        # read at TS, write back the next cycle
+        clearing = Signal()
+        clear_index = Signal(index_bits)
+        update = Signal()
+        update_page = Signal(index_bits)
+        update_write = Signal()
+        reads = Signal(16)
+        writes = Signal(16)
+        new_reads = Signal(16)
+        new_writes = Signal(16)
+        self.comb += [
+            reads.eq(cpu_port.dat_r[0:16]),
+            writes.eq(cpu_port.dat_r[16:32]),
+            new_reads.eq(reads + (~update_write & (reads != 0xFFFF))),
+            new_writes.eq(writes + (update_write & (writes != 0xFFFF))),
+            If(clearing,
+               cpu_port.adr.eq(clear_index),
+               cpu_port.dat_w.eq(0),
+               cpu_port.we.eq(1),
+            ).Elif(update,
+               cpu_port.adr.eq(update_page),
+               cpu_port.dat_w.eq(Cat(new_reads, new_writes)),
+               cpu_port.we.eq(1),
+            ).Else(
+               cpu_port.adr.eq(page),
+            ),
+        ]
+        cpu_sync += [
+            update.eq(enable & ~clearing & self.access & hit),
+            update_page.eq(page),
+            update_write.eq(self.write),
+            If(self.clear_ps.o,
+               clearing.eq(1),
+               clear_index.eq(0),
+            ).Elif(clearing,
+               clear_index.eq(clear_index + 1),
+               If(clear_index == (entries - 1),
+                  clearing.eq(0),
+               ),
+            ),
+        ]
@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+#
+# Hot page report from a dump of the AccessHeatmap table (heatmap.py, --heatmap).
+#
+# The dump is the 'data' CSR read for each 'index' from 0 to entries-1, one hex word per line
+# (reads in the low 16 bits, writes in the high 16 bits, '#' starts a comment), e.g. from a
+# MacsBug/MPW loop over the CSRs. The windows must be the ones the gateware was built with.
+#
+# Usage:
+#   python3 heatmap_report.py heatmap.txt
+#   python3 heatmap_report.py heatmap.txt --top 50 --sort writes
+#
+
+import sys
+import argparse
+
+from heatmap import default_windows
+
+SATURATED = 0xFFFF
+
+def load_dump(filename):
+    words = []
+    with open(filename) as f:
+        for line in f:
+            line = line.split("#", 1)[0].strip()
+            if line:
+                words.append(int(line.split()[-1], 16)) # "index: word" or just "word"
+    return words
+
+def decode(words, windows):
+    entries = sum(size // page_size for (name, base, size, page_size) in windows)
+    if (len(words) != entries):
+        raise ValueError(f"{len(words)} entries in the dump, {entries} expected for these windows")
+    pages = []
+    i = 0
+    for (name, base, size, page_size) in windows:
+        for p in range(size // page_size):
+            reads, writes = words[i] & 0xFFFF, words[i] >> 16
+            if (reads or writes):
+                pages.append({ "window": name, "address": base + p * page_size, "size": page_size, "reads": reads, "writes": writes })
+            i += 1
+    return pages
+
+def print_report(pages, windows, top, sort):
+    total = sum(p["reads"] + p["writes"] for p in pages)
+    print(f"{'window':<10} {'reads':>10} {'writes':>10} {'pages':>6}")
+    for (name, base, size, page_size) in windows:
+        wp = [p for p in pages if p["window"] == name]
+        print(f"{name:<10} {sum(p['reads'] for p in wp):>10} {sum(p['writes'] for p in wp):>10} {len(wp):>6}")
+    print()
+    key = { "total": lambda p: p["reads"] + p["writes"], "reads": lambda p: p["reads"], "writes": lambda p: p["writes"] }[sort]
+    print(f"{'page':<21} {'window':<10} {'reads':>6} {'writes':>6} {'share':>6}")
+    for p in sorted(pages, key=key, reverse=True)[:top]:
+        saturated = " *" if (p["reads"] == SATURATED) or (p["writes"] == SATURATED) else ""
+        share = 100.0 * (p["reads"] + p["writes"]) / total
+        print(f"{p['address']:08x}-{p['address'] + p['size'] - 1:08x}    {p['window']:<10} {p['reads']:>6} {p['writes']:>6} {share:5.1f}%{saturated}")
+    if any((p["reads"] == SATURATED) or (p["writes"] == SATURATED) for p in pages):
+        print("* saturated counter, clear the table and sample a shorter interval")
+
+def main():
+    parser = argparse.ArgumentParser(description="QuadraFPGA access heatmap report")
+    parser.add_argument("dump", help="Table dump, one hex word per entry")
+    parser.add_argument("--top", type=int, default=20, help="Number of pages listed (default 20)")
+    parser.add_argument("--sort", choices=("total", "reads", "writes"), default="total", help="Sort key (default total)")
+    args = parser.parse_args()
+
+    pages = decode(load_dump(args.dump), default_windows)
+    if not pages:
+        print("no access recorded")
+        sys.exit(0)
+    print_report(pages, default_windows, args.top, args.sort)
+
+if __name__ == "__main__":
+    main()
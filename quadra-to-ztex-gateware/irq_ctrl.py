@@ -0,0 +1,82 @@
+from migen import *
+
+from litex.soc.interconnect.csr import *
+
+# Interrupt controller in front of nmrq6
+# Sources are active-low lines in the sys domain, an event is a new assertion of a line
+# sources: list of (name, line_n) for pulsed sources (the line is released without the host, each pulse is
+# an event), or (name, line_n, "level") for sources that keep their line asserted until acknowledged at the
+# source (one event per acknowledgment, so they can't be coalesced by count, only by interval)
+# Per source:
+# - events are counted, an interrupt is raised once 'count' events are pending (any pending event for a
+#   level source), or 'interval' cycles after the first pending one, and never sooner than 'interval'
+#   cycles after the previous interrupt; interval = 0 is no timeout & no minimum spacing
+#   (count = 1, interval = 0, the default, is an interrupt per event)
+# - raising an interrupt sets the source bit in 'pending', cleared by writing 1 to 'ack'
+# - 'mask' gates the source from the output
+# so the ISR reads 'pending' to find the source(s) instead of probing each block
+class IRQController(Module, AutoCSR):
+    def __init__(self, sources):
+        nsources = len(sources)
+        self.irq_n = Signal(reset = 1) # active low, to nmrq6
+
+        self.pending = CSRStatus(nsources, description="Raised interrupts, one bit per source")
+        self.ack = CSR(nsources) # write 1 to clear pending bits
+        self.mask = CSRStorage(nsources, reset = (2**nsources)-1, description="Enabled sources")
+
+        pending = Signal(nsources)
+        self.comb += [
+            self.pending.status.eq(pending),
+            self.irq_n.eq(~((pending & self.mask.storage) != 0)),
+        ]
+
+        for i, source in enumerate(sources):
+            (name, line_n) = source[0:2]
+            level = (len(source) > 2) and (source[2] == "level")
+            count = CSRStorage(8, reset = 1, name = f"{name}_count", description="Events per interrupt")
+            interval = CSRStorage(24, reset = 0, name = f"{name}_interval", description="Minimum cycles between interrupts, maximum delay of a pending event")
+            events = CSRStatus(32, name = f"{name}_events", description="Total events (free-running)")
+            setattr(self, f"{name}_count", count)
+            setattr(self, f"{name}_interval", interval)
+            setattr(self, f"{name}_events", events)
+
+            prev_line_n = Signal(reset = 1)
+            event = Signal()
+            waiting = Signal(8)   # events not yet signaled
+            since_irq = Signal(24, reset = 2**24-1) # cycles since last interrupt, saturating
+            since_first = Signal(24) # cycles since the first waiting event, saturating
+            enough = Signal()  # 'count' reached
+            timeout = Signal() # 'interval' since the first waiting event
+            fire = Signal()
+
+            self.comb += [
+                event.eq(prev_line_n & ~line_n),
+                enough.eq((waiting >= count.storage) if not level else 1),
+                timeout.eq((interval.storage != 0) & (since_first >= interval.storage)),
+                fire.eq((waiting != 0) & (since_irq >= interval.storage) & (enough | timeout)),
+            ]
+            self.sync += [
+                prev_line_n.eq(line_n),
+                If(event,
+                   events.status.eq(events.status + 1),
+                ),
+                If(fire,
+                   waiting.eq(event),
+                   since_irq.eq(0),
+                   since_first.eq(0),
+                   pending[i].eq(1),
+                ).Else(
+                    If(event & (waiting != 0xff),
+                       waiting.eq(waiting + 1),
+                    ),
+                    If(since_irq != 2**24-1,
+                       since_irq.eq(since_irq + 1),
+                    ),
+                    If((waiting != 0) & (since_first != 2**24-1),
+                       since_first.eq(since_first + 1),
+                    ),
+                    If(self.ack.re & self.ack.r[i],
+                       pending[i].eq(0),
+                    ),
+                ),
+            ]
@@ -1,3 +1,6 @@
+from functools import reduce
+from operator import or_
+
 from migen import *
 from migen.genlib.fifo import *
 from migen.genlib.cdc import *
@@ -5,13 +8,41 @@ from migen.fhdl.specials import Tristate
 
 import litex
 from litex.soc.interconnect import wishbone
+from litex.soc.interconnect.csr import *
 
-class MC68040_FSM(Module):
-    def __init__(self, soc, wb_read, wb_write, dram_native_r, dram_native_w, cd_cpu="cpu", trace_inst_fifo = None):
+class MC68040_FSM(Module, AutoCSR):
+    # endian_windows: list of (base, size, swap) in 68040 address space, first match wins
+    # swap=True is the NuBusFPGA-compatible byte reversal (byte addresses preserved, 32-bits values swapped on the SoC side)
+    # swap=False is native big-endian (32-bits values preserved, e.g. pixels as seen by Goblin)
+    # anything not in a window is swapped
+    # declrom_shadow: optional DeclROMShadow, declaration ROM reads are then served from block RAM in the cpu domain
+    # wb_read/wb_write are 32 or 128 bits wide (--bus-data-width), with 128 bits line reads & writes are single wishbone accesses
+    # write_queues: list of (name, wb, base, size, after), posted writes to [base, base+size) in SoC address space
+    # go through their own queue and wishbone master 'wb' (same width as wb_write) instead of wb_write, so they
+    # don't wait behind each other; a write waits until the queues named in 'after' are drained ("" is wb_write's)
+    # fence_address: 68040 address (of a line) where a write is only acknowledged once all posted writes are done
+    # scratchpad: optional Scratchpad, reads & writes (including lines) are then served from block RAM in the cpu domain, TA every cycle
+    # heatmap: optional AccessHeatmap, fed with every transaction start on the bus (including the ones for other devices)
+    # move16: MOVE16 (TT = 1) fast paths, line writes to superslot space go to dram_native_w like the framebuffer ones,
+    # and line reads prefetch the next line from dram_native_r
+    # move16_invalidate: optional signal (sys domain), set when another master writes to SDRAM, drops the MOVE16 prefetch
+    # tt_counters: optional TransferTypeCounters, fed with every transaction start for the card
+    # ready: optional signal (any domain), until it's set the card doesn't answer at all, as if it wasn't there
+    def __init__(self, soc, wb_read, wb_write, dram_native_r, dram_native_w, cd_cpu="cpu", trace_inst_fifo = None, endian_windows = None, declrom_shadow = None, write_queues = None, fence_address = None, scratchpad = None, heatmap = None, move16 = False, move16_invalidate = None, tt_counters = None, ready = None):
 
         platform = soc.platform
 
+        if (endian_windows == None):
+            endian_windows = []
+        if (write_queues == None):
+            write_queues = []
+
         sync_cpu = getattr(self.sync, cd_cpu)
+
+        wb_dw = len(wb_read.dat_r)
+        assert((wb_dw in (32, 128)) and (len(wb_write.dat_w) == wb_dw))
+        wb_line = (wb_dw == 128) # a whole line in a wishbone word
+        wb_adr_shift = log2_int(wb_dw // 8)
         
         # 68040
         A = platform.request("A_3v3") # 32 # address, I[O]
@@ -40,17 +71,31 @@ class MC68040_FSM(Module):
         D_rev_i = Signal(32)
         D_rev_o = Signal(32)
 
+        # byte lanes policy, per address window
+        swap_lanes = Signal()
+        swap_lanes_cases = [ swap_lanes.eq(1) ]
+        for (base, size, swap) in reversed(endian_windows):
+            assert(((size & (size - 1)) == 0) and ((base & (size - 1)) == 0)) # naturally aligned power of two
+            bits = log2_int(size)
+            swap_lanes_cases = [ If(A_i[bits:32] == (base >> bits), swap_lanes.eq(swap)).Else(*swap_lanes_cases) ]
+        self.comb += swap_lanes_cases
+
         # ugly byte reversal, invert endianess to match NuBusFPGA ...
         self.comb += [
-            D_rev_i[ 0: 8].eq(D_i[24:32]),
-            D_rev_i[ 8:16].eq(D_i[16:24]),
-            D_rev_i[16:24].eq(D_i[ 8:16]),
-            D_rev_i[24:32].eq(D_i[ 0: 8]),
+            If(swap_lanes,
+               D_rev_i[ 0: 8].eq(D_i[24:32]),
+               D_rev_i[ 8:16].eq(D_i[16:24]),
+               D_rev_i[16:24].eq(D_i[ 8:16]),
+               D_rev_i[24:32].eq(D_i[ 0: 8]),
             
-            D_o[ 0: 8].eq(D_rev_o[24:32]),
-            D_o[ 8:16].eq(D_rev_o[16:24]),
-            D_o[16:24].eq(D_rev_o[ 8:16]),
-            D_o[24:32].eq(D_rev_o[ 0: 8]),
+               D_o[ 0: 8].eq(D_rev_o[24:32]),
+               D_o[ 8:16].eq(D_rev_o[16:24]),
+               D_o[16:24].eq(D_rev_o[ 8:16]),
+               D_o[24:32].eq(D_rev_o[ 0: 8]),
+            ).Else( # ... unless in a native window
+                D_rev_i.eq(D_i),
+                D_o.eq(D_rev_o),
+            )
         ]
         
         RW_i_n = Signal(1)
@@ -64,6 +109,9 @@ class MC68040_FSM(Module):
         
         TT_i = Signal(2)
         self.comb += [ TT_i.eq(TT) ]
+
+        is_move16 = Signal() # TT = 1, always a line
+        self.comb += [ is_move16.eq(TT_i == 0x1) ]
         
         TS_i_n = Signal()
         self.comb += [ TS_i_n.eq(TS_n) ]
@@ -125,9 +173,16 @@ class MC68040_FSM(Module):
             superslot_processed_ad[28:32].eq(Signal(4, reset=0x8)), # 0x80 >> 4 == 0x8
         ]
 
+        # not ready (e.g. SDRAM not initialized yet), nothing is ours
+        bridge_ready = Signal()
+        if (ready is not None):
+            self.specials += MultiReg(ready, bridge_ready, cd_cpu)
+        else:
+            self.comb += [ bridge_ready.eq(1) ]
+
         # selection logic
         my_slot_space = Signal()
-        self.comb += [ my_slot_space.eq((A_i[24:32] == 0xFE)) ] # fixme: abstract slot $E
+        self.comb += [ my_slot_space.eq(bridge_ready & (A_i[24:32] == 0xFE)) ] # fixme: abstract slot $E
         
         my_mem_space = Signal()
         # As soons as I enable this at $2000_0000 to $2FFF_FFFF, some "chimes of death" occur...
@@ -141,10 +196,50 @@ class MC68040_FSM(Module):
         self.comb += [ my_mem_space.eq(MI_i_n & 0), ]
         
         my_superslot_space = Signal()
-        self.comb += [ my_superslot_space.eq((A_i[28:32] == 0xE)) ] # 0xE0 >> 4 == 0xE # fixme: abstract slot $E
+        self.comb += [ my_superslot_space.eq(bridge_ready & (A_i[28:32] == 0xE)) ] # 0xE0 >> 4 == 0xE # fixme: abstract slot $E
         
         my_device_space = Signal() # all three above
 
+        native_read_space = Signal() # line reads from SDRAM through dram_native_r (framebuffer window & superslot)
+        self.comb += [ native_read_space.eq(my_superslot_space | (my_slot_space & ~A_i[23])) ]
+
+        if (heatmap != None):
+            self.comb += [ heatmap.access.eq(~TS_i_n),
+                           heatmap.address.eq(A_i),
+                           heatmap.write.eq(~RW_i_n),
+            ]
+
+        if (tt_counters != None):
+            self.comb += [ tt_counters.access.eq(~TS_i_n & my_device_space),
+                           tt_counters.write.eq(~RW_i_n),
+                           tt_counters.tt.eq(TT_i),
+                           tt_counters.tm.eq(TM_i),
+            ]
+
+        fence_hit = Signal()
+        if (fence_address != None):
+            self.comb += [ fence_hit.eq(bridge_ready & (A_i[4:32] == (fence_address >> 4))) ] # a line, so all beats of an inhibited burst hit
+
+        rom_shadow_hit = Signal()
+        rom_shadow_data = Signal(32)
+        if (declrom_shadow != None):
+            # the ROM is in the second 8 MiB of slot space (direct access)
+            assert((declrom_shadow.rom_base >> 23) == ((0xf0 << 1) | 1))
+            rom_bits = log2_int(declrom_shadow.rom_size)
+            self.comb += [ rom_shadow_hit.eq(declrom_shadow.done & my_slot_space & (A_i[rom_bits:24] == ((declrom_shadow.rom_base & 0xFFFFFF) >> rom_bits))),
+                           rom_shadow_data.eq(declrom_shadow.rd_port.dat_r),
+            ]
+
+        scratch_hit = Signal()
+        scratch_data = Signal(32)
+        if (scratchpad != None):
+            # also in the second 8 MiB of slot space
+            assert((scratchpad.base >> 23) == ((0xf0 << 1) | 1))
+            scratch_bits = log2_int(scratchpad.size)
+            self.comb += [ scratch_hit.eq(my_slot_space & (A_i[scratch_bits:24] == ((scratchpad.base & 0xFFFFFF) >> scratch_bits))),
+                           scratch_data.eq(scratchpad.cpu_port.dat_r),
+            ]
+
         # more selection logic
         processed_ad = Signal(32)
         self.comb += [
@@ -164,28 +259,89 @@ class MC68040_FSM(Module):
         # write FIFO to speed up bus turnaround on CPU side
         write_fifo_layout = [
             ("adr", 32),
-            ("data", 32),
-            ("sel", 4),
+            ("data", wb_dw),
+            ("sel", wb_dw // 8),
         ]
         #self.submodules.write_fifo = ClockDomainsRenamer({"read": "sys", "write": cd_cpu})(AsyncFIFOBuffered(width=layout_len(write_fifo_layout), depth=16))
         #write_fifo_front = self.write_fifo
         #write_fifo_back = self.write_fifo
         front_fifo_depth = 8
         front_fifo_level_check = (front_fifo_depth - 4) # will be compared to 'level', "Number of unread entries", we need at least 4 free slots for a burst
-        self.submodules.write_fifo_front = write_fifo_front = ClockDomainsRenamer(cd_cpu)(SyncFIFOBuffered(width=layout_len(write_fifo_layout), depth=front_fifo_depth))
-        self.submodules.write_fifo_back  = write_fifo_back =  ClockDomainsRenamer({"read": "sys",  "write": cd_cpu})(AsyncFIFOBuffered(width=layout_len(write_fifo_layout), depth=32))
-        
-        write_fifo_back_dout = Record(write_fifo_layout)
-        self.comb += write_fifo_back_dout.raw_bits().eq(write_fifo_back.dout)
-        write_fifo_front_din = Record(write_fifo_layout)
-        self.comb += write_fifo_front.din.eq(write_fifo_front_din.raw_bits())
+        write_fifo_front_din = Record(write_fifo_layout) # shared by all queues
 
-        # back-to-back FIFO
+        # one front/back FIFO pair & wishbone master per queue, the first one (wb_write) takes what no other queue matches
+        queues = [ ("", wb_write, 0, 0, []) ] + list(write_queues)
+        queue_names = [ name for (name, wb, base, size, after) in queues ]
+        wq_sel = Signal(max = max(2, len(queues))) # queue of the current write
+        wq_sel_cases = [ wq_sel.eq(0) ]
+        for i, (name, wb, base, size, after) in reversed(list(enumerate(queues))[1:]):
+            assert(((size & (size - 1)) == 0) and ((base & (size - 1)) == 0)) # naturally aligned power of two
+            bits = log2_int(size)
+            wq_sel_cases = [ If(processed_ad[bits:32] == (base >> bits), wq_sel.eq(i)).Else(*wq_sel_cases) ]
+        self.comb += wq_sel_cases
+        wq_we = Signal() # write the current write to its queue
+        wq_fronts = []
+        wq_pending = [] # entries in either FIFO of the queue, as seen from the cpu domain
+        for i, (name, wb, base, size, after) in enumerate(queues):
+            suffix = ("_" + name) if name else ""
+            front = ClockDomainsRenamer(cd_cpu)(SyncFIFOBuffered(width=layout_len(write_fifo_layout), depth=front_fifo_depth))
+            back = ClockDomainsRenamer({"read": "sys",  "write": cd_cpu})(AsyncFIFOBuffered(width=layout_len(write_fifo_layout), depth=32))
+            setattr(self.submodules, "write_fifo_front" + suffix, front)
+            setattr(self.submodules, "write_fifo_back" + suffix, back)
+
+            back_dout = Record(write_fifo_layout)
+            self.comb += [
+                back_dout.raw_bits().eq(back.dout),
+                front.din.eq(write_fifo_front_din.raw_bits()),
+                front.we.eq(wq_we & (wq_sel == i)),
+            ]
+
+            # back-to-back FIFO
+            self.comb += [
+                front.re.eq(back.writable),
+                back.we.eq(front.readable),
+                # The XOR with 0xFFFFFFFF here and in the FIFO output serves not logical purpose, other than it doesn't work without it!!!
+                back.din.eq(front.dout ^ Cat(Signal(32, reset = 0), Signal(wb_dw, reset = 2**wb_dw-1), Signal(wb_dw // 8, reset = 0))),
+            ]
+
+            # deal with emptying the Write FIFO to the write WB
+            self.comb += [ wb.cyc.eq(back.readable),
+                           wb.stb.eq(back.readable),
+                           wb.we.eq(1),
+                           wb.adr.eq(back_dout.adr[wb_adr_shift:32]),
+                           wb.dat_w.eq(back_dout.data),
+                           wb.sel.eq(back_dout.sel),
+                           back.re.eq(wb.ack),
+            ]
+
+            # back-pressure from sys to cpu clock domain for RAW hazards & ordering
+            back_readable_sync = BusSynchronizer(width = 1, idomain = "sys", odomain = cd_cpu)
+            setattr(self.submodules, "write_fifo_back_readable_sync" + suffix, back_readable_sync)
+            pending = Signal()
+            self.comb += [
+                back_readable_sync.i.eq(back.readable),
+                pending.eq(back_readable_sync.o | front.readable),
+            ]
+            wq_fronts.append(front)
+            wq_pending.append(pending)
+
+        # ordering: a write waits until the queues it's 'after' are drained
+        # the native line writes (dram_native_w, SDRAM at 0x80000000) count as part of the queue covering SDRAM,
+        # so e.g. a CSR doorbell ordered after "fb" also waits for the framebuffer line bursts
+        native_lines_pending = Signal() # see burst below
+        native_queue = 0
+        for i, (name, wb, base, size, after) in enumerate(queues[1:], 1):
+            if ((base <= 0x80000000) and (0x80000000 < (base + size))):
+                native_queue = i
+        wq_ordered_pending = [ (pending | native_lines_pending) if (i == native_queue) else pending for i, pending in enumerate(wq_pending) ]
+        wq_writable = Signal()
+        wq_level = Signal(max = front_fifo_depth + 1)
+        wq_blocked = Signal()
+        native_lines_blocking = Signal() # see burst below
         self.comb += [
-            write_fifo_front.re.eq(write_fifo_back.writable),
-            write_fifo_back.we.eq(write_fifo_front.readable),
-            # The XOR with 0xFFFFFFFF here and in the FIFO output serves not logical purpose, other than it doesn't work without it!!!
-            write_fifo_back.din.eq(write_fifo_front.dout ^ Cat(Signal(32, reset = 0), Signal(32, reset = 0xFFFFFFFF), Signal(4, reset = 0))),
+            wq_writable.eq(Array([front.writable for front in wq_fronts])[wq_sel]),
+            wq_level.eq(Array([front.level for front in wq_fronts])[wq_sel]),
+            wq_blocked.eq(Array([reduce(or_, [wq_ordered_pending[queue_names.index(a)] for a in after], Constant(0)) for (name, wb, base, size, after) in queues])[wq_sel] | native_lines_blocking),
         ]
 
         
@@ -200,20 +356,39 @@ class MC68040_FSM(Module):
         self.comb += write_fifo_burst_dout.raw_bits().eq(write_fifo_burst.dout)
         write_fifo_burst_din = Record(write_fifo_burst_layout)
         self.comb += write_fifo_burst.din.eq(write_fifo_burst_din.raw_bits())
-        
+        # commands are issued ahead of the data, which waits here for the port (in order)
+        burst_cmds_ahead = 4
+        self.submodules.write_fifo_burst_data = write_fifo_burst_data = ClockDomainsRenamer(cd_cpu)(SyncFIFO(width=128, depth=burst_cmds_ahead))
+        burst_inflight = Signal(max=burst_cmds_ahead + 1) # commands accepted, data not yet
 
-        # back-pressure from sys to cpu clock domain for RAW hazards
-        self.submodules.write_fifo_back_readable_sync = BusSynchronizer(width = 1, idomain = "sys", odomain = cd_cpu)
-        write_fifo_back_readable_in_cpu = Signal()
-        self.comb += self.write_fifo_back_readable_sync.i.eq(write_fifo_back.readable)
-        self.comb += write_fifo_back_readable_in_cpu.eq(self.write_fifo_back_readable_sync.o)
+        # RAW hazards, reads (and fences) wait for all posted writes
+        # WAW hazards, any other write to SDRAM (whatever the queue) waits for the native line writes,
+        # and the native line writes for the wishbone queue covering SDRAM
+        writes_pending = Signal()
+        burst_writable = Signal()
+        self.comb += [
+            native_lines_pending.eq(write_fifo_burst.readable | (burst_inflight != 0)),
+            writes_pending.eq(reduce(or_, wq_pending) | native_lines_pending),
+            native_lines_blocking.eq((processed_ad[28:32] == 0x8) & native_lines_pending),
+            burst_writable.eq(write_fifo_burst.writable & ~wq_pending[native_queue]),
+        ]
+
+        # MOVE16 line writes to superslot space take the native path too, ordered with the other superslot writes:
+        # they wait for the wishbone queues to be empty, and the other writes for them to be done (as above)
+        move16_native_write = Signal()
+        if (move16):
+            self.comb += [
+                move16_native_write.eq(my_superslot_space & is_move16 & ~reduce(or_, wq_pending)),
+            ]
 
         self.submodules.slave_fsm = slave_fsm = ClockDomainsRenamer(cd_cpu)(FSM(reset_state="Reset"))
 
         ### dram_native_r
+        pf_issue = Signal() # MOVE16 prefetch, see below
+        pf_adr = Signal(28)
         self.comb += [
             dram_native_r.cmd.we.eq(0),
-            dram_native_r.cmd.addr.eq(processed_ad[4:]), # assume 128 bits (16 bytes)
+            dram_native_r.cmd.addr.eq(Mux(pf_issue, pf_adr, processed_ad[4:])), # assume 128 bits (16 bytes)
         ]
         ## dram_native_r.cmd.valid ->
         ## dram_native_r.cmd.we ->
@@ -223,6 +398,91 @@ class MC68040_FSM(Module):
         burst_counter = Signal(2)
         burst_buffer = Signal(128)
 
+        # MOVE16 prefetch: after a MOVE16 line read, the next line is read into pf_buffer (once the posted writes
+        # are done, from Idle), and a MOVE16 read of that line is then served from it with TA every cycle
+        # Any other transaction for the card, or a MOVE16 write to that line, drops it, and so do the SDRAM writes
+        # of the other masters through 'move16_invalidate' (whatever the line, a few cycles late)
+        pf_want = Signal()  # pf_adr to be read
+        pf_busy = Signal()  # read issued, data not back yet
+        pf_valid = Signal() # pf_adr not dropped, pf_buffer holds it once ~pf_want & ~pf_busy
+        pf_buffer = Signal(128)
+        pf_hit = Signal()
+        pf_used = Signal()
+        if (move16):
+            pf_line = Signal()
+            self.comb += [
+                pf_line.eq(processed_ad[4:32] == pf_adr),
+                pf_hit.eq(is_move16 & RW_i_n & pf_valid & ~pf_want & ~pf_busy & pf_line),
+                pf_issue.eq(slave_fsm.ongoing("Idle") & TS_i_n & pf_want & ~writes_pending),
+                If(pf_issue,
+                   dram_native_r.cmd.valid.eq(1),
+                ),
+                If(pf_busy,
+                   dram_native_r.rdata.ready.eq(1),
+                ),
+            ]
+            sync_cpu += [
+                If(pf_issue & dram_native_r.cmd.ready,
+                   pf_want.eq(0),
+                   pf_busy.eq(1),
+                ),
+                If(pf_busy & dram_native_r.rdata.valid,
+                   pf_buffer.eq(dram_native_r.rdata.data),
+                   pf_busy.eq(0),
+                ),
+                If(~TS_i_n & my_device_space & ~(is_move16 & (RW_i_n == pf_line)), # only a read of the line or a write elsewhere keep it
+                   pf_want.eq(0),
+                   pf_valid.eq(0),
+                ).Elif(slave_fsm.ongoing("FBMemBurstRead") & (burst_counter == 0x3) & is_move16 & native_read_space, # not the wishbone lines (wb_line)
+                   pf_want.eq(1),
+                   pf_valid.eq(1),
+                   pf_adr.eq(processed_ad[4:32] + 1),
+                ),
+            ]
+            # SDRAM written by someone else: the prefetch (or the read in flight) may be stale
+            pf_stale = Signal()
+            pf_stale_sources = []
+            if (move16_invalidate is not None):
+                # held for a few cpu cycles, so that every write is seen once synchronized
+                stale_count = Signal(4)
+                stale_sys = Signal()
+                stale_cpu = Signal()
+                self.sync += [
+                    If(move16_invalidate,
+                       stale_count.eq(15),
+                    ).Elif(stale_count != 0,
+                       stale_count.eq(stale_count - 1),
+                    ),
+                    stale_sys.eq(move16_invalidate | (stale_count != 0)),
+                ]
+                self.specials += MultiReg(stale_sys, stale_cpu, cd_cpu)
+                pf_stale_sources.append(stale_cpu)
+            self.comb += pf_stale.eq(reduce(or_, pf_stale_sources, Constant(0)))
+            sync_cpu += [
+                If(pf_stale, # after the above, it wins
+                   pf_want.eq(0),
+                   pf_valid.eq(0),
+                ),
+            ]
+
+        ### wb_read
+        wb_read_sel = Signal(wb_dw // 8)
+        wb_read_data = Signal(32) # the addressed long word
+        if (wb_line):
+            self.comb += [
+                If(SIZ_i == 0x3, # line
+                   wb_read_sel.eq(0xFFFF),
+                ).Else( # only the addressed long word, so a down-converter doesn't touch the others (CSRs)
+                    wb_read_sel.eq(0xF << Cat(Signal(2, reset = 0), processed_ad[2:4])),
+                ),
+                wb_read_data.eq(Array([wb_read.dat_r[32*i:32*(i+1)] for i in range(4)])[processed_ad[2:4]]),
+            ]
+        else:
+            self.comb += [
+                wb_read_sel.eq(0xF), # always read 32-bits for cache
+                wb_read_data.eq(wb_read.dat_r),
+            ]
+
         finishing = Signal()
         
         slave_fsm.act("Reset",
@@ -237,7 +497,7 @@ class MC68040_FSM(Module):
                       TEA_o_n.eq(1),
                       TBI_oe.eq(finishing & ClockSignal(cd_cpu)),
                       TBI_o_n.eq(1),
-                      If(my_slot_space & ~A_i[23] & ~TS_i_n & ~RW_i_n & SIZ_i[0] & SIZ_i[1], # Burst write to FB memory
+                      If(((my_slot_space & ~A_i[23]) | move16_native_write) & ~TS_i_n & ~RW_i_n & SIZ_i[0] & SIZ_i[1], # Burst write to FB memory (or MOVE16 to superslot)
                              TA_oe.eq(1),
                              TA_o_n.eq(1),
                              TEA_oe.eq(1),
@@ -246,12 +506,12 @@ class MC68040_FSM(Module):
                              TBI_o_n.eq(1),
                              NextValue(burst_counter, 0), # '040 burst are aligned
                              #NextValue(A_latch, processed_ad),
-                             If(write_fifo_burst.writable,
+                             If(burst_writable,
                                 NextState("FBMemBurstWrite"),
                              ).Else(
                                 NextState("DelayFBMemBurstWrite"),
                              )
-                      ).Elif((my_superslot_space | (my_slot_space & ~A_i[23])) & ~TS_i_n & RW_i_n & SIZ_i[0] & SIZ_i[1], # Burst read to (FB) memory
+                      ).Elif(native_read_space & ~TS_i_n & RW_i_n & SIZ_i[0] & SIZ_i[1], # Burst read to (FB) memory
                              TA_oe.eq(1),
                              TA_o_n.eq(1),
                              TEA_oe.eq(1),
@@ -260,7 +520,11 @@ class MC68040_FSM(Module):
                              TBI_o_n.eq(1),
                              NextValue(burst_counter, 0), # '040 burst are aligned
                              #dram_native_r.cmd.we.eq(0),
-                             If(~write_fifo_back_readable_in_cpu & ~write_fifo_front.readable & ~write_fifo_burst.readable, # previous write(s) done
+                             If(pf_hit, # MOVE16, already there
+                                pf_used.eq(1),
+                                NextValue(burst_buffer, pf_buffer),
+                                NextState("FBMemBurstRead"),
+                             ).Elif(~writes_pending & ~pf_busy, # previous write(s) done
                                 dram_native_r.cmd.valid.eq(1),
                                 If(dram_native_r.cmd.ready, # interface available
                                    NextState("FBMemBurstReadWait"),
@@ -270,6 +534,27 @@ class MC68040_FSM(Module):
                              ).Else(
                                  NextState("DelayFBMemBurstReadWait"),
                              )
+                      ).Elif(fence_hit & ~TS_i_n & ~RW_i_n, # Fence, the data is dropped
+                             TA_oe.eq(1),
+                             TA_o_n.eq(1),
+                             TEA_oe.eq(1),
+                             TEA_o_n.eq(1),
+                             TBI_oe.eq(1),
+                             TBI_o_n.eq(1),
+                             NextState("Fence"),
+                      ).Elif(scratch_hit & ~TS_i_n, # scratchpad, not ordered with the posted writes
+                             TA_oe.eq(1),
+                             TA_o_n.eq(1),
+                             TEA_oe.eq(1),
+                             TEA_o_n.eq(1),
+                             TBI_oe.eq(1),
+                             TBI_o_n.eq(1),
+                             NextValue(burst_counter, 0), # '040 burst are aligned
+                             If(RW_i_n,
+                                NextState("ScratchRead"),
+                             ).Else(
+                                NextState("ScratchWrite"),
+                             ),
                       ).Elif((my_device_space & ~TS_i_n & ~RW_i_n & SIZ_i[0] & SIZ_i[1]), # burst Write through FIFO
                              TA_oe.eq(1),
                              TA_o_n.eq(1),
@@ -279,11 +564,20 @@ class MC68040_FSM(Module):
                              TBI_o_n.eq(1),
                              #NextValue(A_latch, processed_ad),
                              NextValue(burst_counter, 0), # '040 burst are aligned
-                             If(write_fifo_front.level < front_fifo_level_check, #~write_fifo_front.readable, # FIXME # the front FIFO is empty, we have enough space ; should use level instead ?
+                             If((wq_level < front_fifo_level_check) & ~wq_blocked, #~write_fifo_front.readable, # FIXME # the front FIFO is empty, we have enough space ; should use level instead ?
                                 NextState("BurstWrite"),
                              ).Else(
                                  NextState("DelayBurstWrite"),
                              )
+                      ).Elif(rom_shadow_hit & ~TS_i_n & RW_i_n, # declaration ROM Read, from the shadow copy, no need to wait for writes
+                             TA_oe.eq(1),
+                             TA_o_n.eq(1),
+                             TEA_oe.eq(1),
+                             TEA_o_n.eq(1),
+                             TBI_oe.eq(1),
+                             TBI_o_n.eq(1),
+                             NextValue(burst_counter, 0), # '040 burst are aligned
+                             NextState("ROMShadowRead"),
                       ).Elif((my_device_space & ~TS_i_n & RW_i_n), # non-burst or non-memory Read  & (~SIZ_i[0] | ~SIZ_i[1])
                              ###
                              #trace_inst_fifo.we.eq(1),
@@ -297,12 +591,12 @@ class MC68040_FSM(Module):
                              TBI_o_n.eq(1),
                              NextValue(burst_counter, 0),
                              #NextValue(A_latch, processed_ad),
-                             If(~write_fifo_back_readable_in_cpu & ~write_fifo_front.readable & ~write_fifo_burst.readable, # previous write(s) done
+                             If(~writes_pending, # previous write(s) done
                                 wb_read.cyc.eq(1),
                                 wb_read.stb.eq(1),
                                 wb_read.we.eq(0),
-                                wb_read.sel.eq(0xf), # always read 32-bits for cache
-                                wb_read.adr.eq(processed_ad[2:32]),
+                                wb_read.sel.eq(wb_read_sel),
+                                wb_read.adr.eq(processed_ad[wb_adr_shift:32]),
                                 NextState("Read"),
                              ).Else( # TS_i_n is asserted for only 1 cycle, so need to remember
                                  NextState("DelayRead"),
@@ -330,21 +624,33 @@ class MC68040_FSM(Module):
                       TBI_oe.eq(1),
                       TBI_o_n.eq(1),
                       D_oe.eq(0),
-                      If(~write_fifo_back_readable_in_cpu & ~write_fifo_front.readable & ~write_fifo_burst.readable, # previous write(s) done
+                      If(~writes_pending, # previous write(s) done
                          wb_read.cyc.eq(1),
                          wb_read.stb.eq(1),
                          wb_read.we.eq(0),
-                         wb_read.sel.eq(0xf), # always read 32-bits for cache
-                         wb_read.adr.eq(processed_ad[2:32]),
+                         wb_read.sel.eq(wb_read_sel),
+                         wb_read.adr.eq(processed_ad[wb_adr_shift:32]),
                          NextState("Read"),
                       )
         )
+        if (wb_line):
+            read_line_ack = [ # the whole line was read, the other beats come from the buffer
+                NextValue(burst_buffer, wb_read.dat_r),
+                NextValue(burst_counter, 1),
+                NextState("FBMemBurstRead"),
+            ]
+        else:
+            read_line_ack = [
+                TBI_o_n.eq(0), # do not burst here
+                NextValue(finishing, 1),
+                NextState("Idle"),
+            ]
         slave_fsm.act("Read",
                       wb_read.cyc.eq(1),
                       wb_read.stb.eq(1),
                       wb_read.we.eq(0),
-                      wb_read.sel.eq(0xf),
-                      wb_read.adr.eq(processed_ad[2:32]),
+                      wb_read.sel.eq(wb_read_sel),
+                      wb_read.adr.eq(processed_ad[wb_adr_shift:32]),
                       TA_oe.eq(1),
                       TA_o_n.eq(1),
                       TEA_oe.eq(1),
@@ -352,7 +658,7 @@ class MC68040_FSM(Module):
                       TBI_oe.eq(1),
                       TBI_o_n.eq(1),
                       D_oe.eq(1),
-                      D_rev_o.eq(wb_read.dat_r),
+                      D_rev_o.eq(wb_read_data),
                       If(wb_read.ack,
                          ####
                          #trace_inst_fifo.we.eq(1),
@@ -360,11 +666,59 @@ class MC68040_FSM(Module):
                          ####
                          TA_o_n.eq(0), # ACK
                          If (SIZ_i == 0x3, # line
-                             TBI_o_n.eq(0), # do not burst here
+                             *read_line_ack
+                         ).Else(
+                             NextValue(finishing, 1),
+                             NextState("Idle"),
                          ),
+                      )
+        )
+        slave_fsm.act("ROMShadowRead",
+                      TA_oe.eq(1),
+                      TA_o_n.eq(0), # always TA here, block RAM has a single cycle latency
+                      TEA_oe.eq(1),
+                      TEA_o_n.eq(1),
+                      TBI_oe.eq(1),
+                      TBI_o_n.eq(1),
+                      D_oe.eq(1),
+                      D_rev_o.eq(rom_shadow_data),
+                      NextValue(burst_counter, burst_counter + 1),
+                      If((SIZ_i != 0x3) | (burst_counter == 0x3), # line or single
                          NextValue(finishing, 1),
                          NextState("Idle"),
-                      )
+                      ),
+        )
+        if (declrom_shadow != None):
+            # address for the current cycle's TS, or the next beat of a line
+            self.comb += [ declrom_shadow.rd_port.adr.eq(A_i[2:rom_bits] + Mux(slave_fsm.ongoing("ROMShadowRead"), burst_counter + 1, 0)) ]
+        slave_fsm.act("ScratchRead",
+                      TA_oe.eq(1),
+                      TA_o_n.eq(0), # always TA here, block RAM has a single cycle latency
+                      TEA_oe.eq(1),
+                      TEA_o_n.eq(1),
+                      TBI_oe.eq(1),
+                      TBI_o_n.eq(1),
+                      D_oe.eq(1),
+                      D_rev_o.eq(scratch_data),
+                      NextValue(burst_counter, burst_counter + 1),
+                      If((SIZ_i != 0x3) | (burst_counter == 0x3), # line or single
+                         NextValue(finishing, 1),
+                         NextState("Idle"),
+                      ),
+        )
+        slave_fsm.act("ScratchWrite",
+                      TA_oe.eq(1),
+                      TA_o_n.eq(0), # always TA here, written as the data is sampled
+                      TEA_oe.eq(1),
+                      TEA_o_n.eq(1),
+                      TBI_oe.eq(1),
+                      TBI_o_n.eq(1),
+                      D_oe.eq(0),
+                      NextValue(burst_counter, burst_counter + 1),
+                      If((SIZ_i != 0x3) | (burst_counter == 0x3), # line or single
+                         NextValue(finishing, 1),
+                         NextState("Idle"),
+                      ),
         )
         slave_fsm.act("DelayWrite",
                       TA_oe.eq(1),
@@ -374,8 +728,8 @@ class MC68040_FSM(Module):
                       TBI_oe.eq(1),
                       TBI_o_n.eq(1),
                       D_oe.eq(0),
-                      If(write_fifo_front.writable,
-                         write_fifo_front.we.eq(1), # write
+                      If(wq_writable & ~wq_blocked,
+                         wq_we.eq(1), # write
                          If(SIZ_i == 0x3,
                             TBI_o_n.eq(0), # don't burst write here
                          ),
@@ -384,6 +738,23 @@ class MC68040_FSM(Module):
                          NextState("Idle"),
                       ),
         )
+        slave_fsm.act("Fence",
+                      TA_oe.eq(1),
+                      TA_o_n.eq(1),
+                      TEA_oe.eq(1),
+                      TEA_o_n.eq(1),
+                      TBI_oe.eq(1),
+                      TBI_o_n.eq(1),
+                      D_oe.eq(0),
+                      If(~writes_pending, # everything posted before is done
+                         If(SIZ_i == 0x3,
+                            TBI_o_n.eq(0), # don't burst here
+                         ),
+                         TA_o_n.eq(0),
+                         NextValue(finishing, 1),
+                         NextState("Idle"),
+                      ),
+        )
         slave_fsm.act("DelayBurstWrite",
                       TA_oe.eq(1),
                       TA_o_n.eq(1),
@@ -392,11 +763,22 @@ class MC68040_FSM(Module):
                       TBI_oe.eq(1),
                       TBI_o_n.eq(1),
                       D_oe.eq(0),
-                      If(write_fifo_front.level < front_fifo_level_check, #~write_fifo_front.readable, # FIXME # the front FIFO is empty, we have enough space ; should use level instead ?
+                      If((wq_level < front_fifo_level_check) & ~wq_blocked, #~write_fifo_front.readable, # FIXME # the front FIFO is empty, we have enough space ; should use level instead ?
                          #TA_o_n.eq(0), # accept first data
                          NextState("BurstWrite"),
                       ),
         )
+        if (wb_line):
+            burst_write_beat = [ # collect the line, then a single FIFO entry
+                Case(burst_counter, {
+                    0x0: [ NextValue(burst_buffer[ 0: 32], D_rev_i), ],
+                    0x1: [ NextValue(burst_buffer[32: 64], D_rev_i), ],
+                    0x2: [ NextValue(burst_buffer[64: 96], D_rev_i), ],
+                    0x3: [ wq_we.eq(1), ],
+                }),
+            ]
+        else:
+            burst_write_beat = [ wq_we.eq(1) ] # we have space
         slave_fsm.act("BurstWrite",
                       TA_oe.eq(1),
                       TA_o_n.eq(0), # always TA here
@@ -406,7 +788,7 @@ class MC68040_FSM(Module):
                       TBI_o_n.eq(1),
                       D_oe.eq(0),
                       NextValue(burst_counter, burst_counter + 1),
-                      write_fifo_front.we.eq(1), # we have space
+                      *burst_write_beat,
                       If(burst_counter == 0x3,
                          NextValue(finishing, 1),
                          NextState("Idle"),
@@ -421,7 +803,7 @@ class MC68040_FSM(Module):
                       TBI_oe.eq(1),
                       TBI_o_n.eq(1),
                       D_oe.eq(0),
-                      If(write_fifo_burst.writable,
+                      If(burst_writable,
                          NextState("FBMemBurstWrite"),
                       ),
         )
@@ -461,7 +843,11 @@ class MC68040_FSM(Module):
                       TBI_o_n.eq(1),
                       D_oe.eq(0),
                       #dram_native_r.cmd.we.eq(0),
-                      If(~write_fifo_back_readable_in_cpu & ~write_fifo_front.readable & ~write_fifo_burst.readable, # previous write(s) done
+                      If(pf_hit, # MOVE16, the prefetch arrived
+                         pf_used.eq(1),
+                         NextValue(burst_buffer, pf_buffer),
+                         NextState("FBMemBurstRead"),
+                      ).Elif(~writes_pending & ~pf_busy, # previous write(s) done
                          dram_native_r.cmd.valid.eq(1),
                          If(dram_native_r.cmd.ready, # interface available
                             NextState("FBMemBurstReadWait"),
@@ -508,86 +894,126 @@ class MC68040_FSM(Module):
         
         # connect the write FIFO inputs
         # The XOR with 0xFFFFFFFF here and in the FIFO transition serves not logical purpose, other than it doesn't work without it!!!
-        self.comb += [ write_fifo_front_din.data.eq(D_rev_i ^ Signal(32, reset = 0xFFFFFFFF)),
-                       write_fifo_front_din.adr.eq(processed_ad + Cat(Signal(2,reset = 0), burst_counter)),
-                       Case(SIZ_i, {
+        write_sel = Signal(4) # for byte-reversed lanes
+        write_sel_lanes = Signal(4)
+        self.comb += [ Case(SIZ_i, {
                            0x0: [ # long word
-                              write_fifo_front_din.sel.eq(0xF),
+                              write_sel.eq(0xF),
                            ],
                            0x1: [ # byte
                                Case(processed_ad[0:2], {
                                    0x0: [
-                                       write_fifo_front_din.sel.eq(0x1),
+                                       write_sel.eq(0x1),
                                    ],
                                    0x1: [
-                                       write_fifo_front_din.sel.eq(0x2),
+                                       write_sel.eq(0x2),
                                    ],
                                    0x2: [
-                                       write_fifo_front_din.sel.eq(0x4),
+                                       write_sel.eq(0x4),
                                    ],
                                    0x3: [
-                                       write_fifo_front_din.sel.eq(0x8),
+                                       write_sel.eq(0x8),
                                    ],
                                }),
                            ],
                            0x2: [ # word
                                Case(processed_ad[1:2], {
                                    0x0: [
-                                       write_fifo_front_din.sel.eq(0x3),
+                                       write_sel.eq(0x3),
                                    ],
                                    0x1: [
-                                       write_fifo_front_din.sel.eq(0xC),
+                                       write_sel.eq(0xC),
                                    ],
                                }),
                            ],
                            0x3: [ # line
-                               write_fifo_front_din.sel.eq(0xF),
+                               write_sel.eq(0xF),
                            ],
                        }),
+                       If(swap_lanes,
+                          write_sel_lanes.eq(write_sel),
+                       ).Else( # native lanes, byte 0 is D[31:24]
+                           write_sel_lanes.eq(Cat(write_sel[3], write_sel[2], write_sel[1], write_sel[0])),
+                       ),
         ]
-        # deal with emptying the Write FIFO to the write WB
-        self.comb += [ wb_write.cyc.eq(write_fifo_back.readable),
-                       wb_write.stb.eq(write_fifo_back.readable),
-                       wb_write.we.eq(1),
-                       wb_write.adr.eq(write_fifo_back_dout.adr[2:32]),
-                       wb_write.dat_w.eq(write_fifo_back_dout.data),
-                       wb_write.sel.eq(write_fifo_back_dout.sel),
-                       write_fifo_back.re.eq(wb_write.ack),
-        ]
+        if (scratchpad != None):
+            # reads: address for the current cycle's TS, or the next beat of a line ; writes: the current beat
+            self.comb += [ scratchpad.cpu_port.adr.eq(A_i[2:scratch_bits] + Mux(slave_fsm.ongoing("ScratchRead"), burst_counter + 1,
+                                                                                Mux(slave_fsm.ongoing("ScratchWrite"), burst_counter, 0))),
+                           scratchpad.cpu_port.dat_w.eq(D_rev_i),
+                           If(slave_fsm.ongoing("ScratchWrite"),
+                              scratchpad.cpu_port.we.eq(write_sel_lanes),
+                           ),
+            ]
+        if (wb_line):
+            self.comb += [ If(SIZ_i == 0x3, # line, collected in burst_buffer
+                              write_fifo_front_din.data.eq(Cat(burst_buffer[0:96], D_rev_i) ^ Signal(wb_dw, reset = 2**wb_dw-1)),
+                              write_fifo_front_din.sel.eq(0xFFFF),
+                           ).Else(
+                               write_fifo_front_din.data.eq(Replicate(D_rev_i, 4) ^ Signal(wb_dw, reset = 2**wb_dw-1)),
+                               write_fifo_front_din.sel.eq(write_sel_lanes << Cat(Signal(2, reset = 0), processed_ad[2:4])),
+                           ),
+                           write_fifo_front_din.adr.eq(processed_ad),
+            ]
+        else:
+            self.comb += [ write_fifo_front_din.data.eq(D_rev_i ^ Signal(32, reset = 0xFFFFFFFF)),
+                           write_fifo_front_din.adr.eq(processed_ad + Cat(Signal(2,reset = 0), burst_counter)),
+                           write_fifo_front_din.sel.eq(write_sel_lanes),
+            ]
 
         ## BURST
-        self.submodules.burst_write_fsm = burst_write_fsm = ClockDomainsRenamer(cd_cpu)(FSM(reset_state="Reset"))
         # connect the burst FIFO input
         self.comb += [
             write_fifo_burst_din.adr.eq(processed_ad),
             write_fifo_burst_din.data.eq(Cat(burst_buffer[0:96], D_rev_i)),
         ]
-        # connect the memory port to the FIFO output
+        # FIFO to mem port: the command is issued as soon as the line is in the FIFO (up to burst_cmds_ahead
+        # before their data), so the command for the next line overlaps the data of the previous ones
+        burst_cmd_done = Signal()
+        burst_data_done = Signal()
         self.comb += [
             dram_native_w.cmd.we.eq(1),
             dram_native_w.cmd.addr.eq(write_fifo_burst_dout.adr[4:]),
-            dram_native_w.wdata.data.eq(write_fifo_burst_dout.data),
+            dram_native_w.cmd.valid.eq(write_fifo_burst.readable & write_fifo_burst_data.writable),
+            burst_cmd_done.eq(dram_native_w.cmd.valid & dram_native_w.cmd.ready),
+            write_fifo_burst.re.eq(burst_cmd_done),
+            write_fifo_burst_data.din.eq(write_fifo_burst_dout.data),
+            write_fifo_burst_data.we.eq(burst_cmd_done),
+
+            dram_native_w.wdata.valid.eq(write_fifo_burst_data.readable),
+            dram_native_w.wdata.data.eq(write_fifo_burst_data.dout),
             dram_native_w.wdata.we.eq(2**len(dram_native_w.wdata.we)-1),
+            burst_data_done.eq(dram_native_w.wdata.valid & dram_native_w.wdata.ready),
+            write_fifo_burst_data.re.eq(burst_data_done),
         ]
-        # FIFO to mem port ctrl
-        burst_write_fsm.act("Reset",
-                            NextState("Idle")
-        )
-        burst_write_fsm.act("Idle",
-                            If(write_fifo_burst.readable,
-                               dram_native_w.cmd.valid.eq(1),
-                               If(dram_native_w.cmd.ready,
-                                  NextState("Data"),
-                               ),
-                            ),
-        )
-        burst_write_fsm.act("Data",
-                            dram_native_w.wdata.valid.eq(1),
-                            If(dram_native_w.wdata.ready,
-                               write_fifo_burst.re.eq(1),
-                               NextState("Idle"),
-                            ),
-        )
+        sync_cpu += [
+            burst_inflight.eq(burst_inflight + burst_cmd_done - burst_data_done),
+        ]
+
+        # burst write throughput: lines written, cycles with lines waiting or in flight, cycles waiting for the port
+        # (lines * 16 / busy is the drain rate in bytes per cpu cycle)
+        self.burst_lines = CSRStatus(32, description="Burst lines written to SDRAM")
+        self.burst_busy = CSRStatus(32, description="CPU cycles with burst lines queued or in flight")
+        self.burst_cmd_stalls = CSRStatus(32, description="CPU cycles with a burst command refused by the port")
+        burst_lines = Signal(32)
+        burst_busy = Signal(32)
+        burst_cmd_stalls = Signal(32)
+        sync_cpu += [
+            If(burst_data_done, burst_lines.eq(burst_lines + 1)),
+            If(write_fifo_burst.readable | (burst_inflight != 0), burst_busy.eq(burst_busy + 1)),
+            If(dram_native_w.cmd.valid & ~dram_native_w.cmd.ready, burst_cmd_stalls.eq(burst_cmd_stalls + 1)),
+        ]
+        counters = [ (burst_lines, self.burst_lines), (burst_busy, self.burst_busy), (burst_cmd_stalls, self.burst_cmd_stalls) ]
+        if (move16):
+            # MOVE16 line reads served from the prefetch buffer
+            self.move16_prefetch_hits = CSRStatus(32, description="MOVE16 line reads served from the prefetch")
+            move16_prefetch_hits = Signal(32)
+            sync_cpu += [ If(pf_used, move16_prefetch_hits.eq(move16_prefetch_hits + 1)) ]
+            counters.append((move16_prefetch_hits, self.move16_prefetch_hits))
+        for (counter, csr) in counters:
+            sync = BusSynchronizer(32, cd_cpu, "sys")
+            self.submodules += sync
+            self.comb += [ sync.i.eq(counter), csr.status.eq(sync.o) ]
         
         
 
@@ -1,4 +1,6 @@
 import os
+from functools import reduce
+from operator import or_
 import argparse
 from migen import *
 from migen.genlib.fifo import *
@@ -11,10 +13,12 @@ from litex.soc.integration.soc import *
 from litex.soc.integration.soc_core import *
 from litex.soc.integration.builder import *
 from litex.soc.interconnect import wishbone
+from litex.soc.interconnect.csr import *
 from litex.soc.cores.clock import *
 from litex.soc.cores.led import LedChaser
 import ztex213_pds040
 import nubus_to_fpga_export
+from build_report import BuildReport
 
 from litedram.modules import MT41J128M16
 from litedram.phy import s7ddrphy
@@ -23,7 +27,7 @@ from litedram.frontend.dma import *
 
 from liteeth.phy.rmii import LiteEthPHYRMII
 
-from migen.genlib.cdc import BusSynchronizer
+from migen.genlib.cdc import BusSynchronizer, MultiReg
 from migen.genlib.resetsync import AsyncResetSynchronizer
 
 from litex.soc.cores.video import VideoS7HDMIPHY
@@ -142,9 +146,20 @@ class _CRG(Module, AutoCSR):
             self.comb += [ locked.eq(pll_idelay.locked & pll.locked) ]
             
             
+# SDRAM init status, for the driver/ROM ------------------------------------------------------------
+class _SDRAMInitStatus(Module, AutoCSR):
+    def __init__(self, init_done, locked, ready):
+        self.status = CSRStatus(fields=[
+            CSRField("init_done", size=1, description="SDRAM initialized & calibrated by the hardware sequencer"),
+            CSRField("locked",    size=1, description="All clocks locked"),
+            CSRField("ready",     size=1, description="Board ready (clocks locked, power-up delay elapsed, SDRAM initialized)"),
+        ])
+        self.comb += [ self.status.fields.init_done.eq(init_done) ]
+        self.specials += MultiReg(locked, self.status.fields.locked)
+        self.specials += MultiReg(ready, self.status.fields.ready)
         
 class QuadraFPGA(MacPeriphSoC):
-    def __init__(self, variant, version, sys_clk_freq, config_flash, goblin, goblin_res, use_goblin_alt, **kwargs):
+    def __init__(self, variant, version, sys_clk_freq, config_flash, goblin, goblin_res, use_goblin_alt, endian_windows = None, declrom_shadow = False, sdram_hwinit = False, irq_ctrl = False, dram_qos = False, status_mailbox = False, cmd_ring = False, write_queues = False, write_queues_relaxed = False, dram_bench = False, scratchpad = False, heatmap = False, clut_commit = False, move16 = False, tt_counters = False, **kwargs):
         print(f"Building QuadraFPGA for board version {version}")
     
         self.platform = platform = ztex213_pds040.Platform(variant = variant, version = version)
@@ -179,9 +194,20 @@ class QuadraFPGA(MacPeriphSoC):
                     platform.add_platform_command(fix_line)
 
         MacPeriphSoC.mac_add_declrom(self, version = version, flash = False, config_flash = config_flash)
+
+        if (declrom_shadow):
+            # copy of the declaration ROM in block RAM, served directly by the bridge
+            from declrom_shadow import DeclROMShadow
+            rom_region = self.bus.regions["rom"]
+            self.submodules.declrom_shadow = DeclROMShadow(rom_base=rom_region.origin, rom_size=rom_region.size, cd_cpu="cpu")
+            self.bus.add_master(name="DeclROMShadow", master=self.declrom_shadow.bus)
+        else:
+            self.declrom_shadow = None
         
+        # with hwinit, the SDRAM is initialized by a hardware sequencer using known-good leveling settings
+        # for this board version, so it's usable as soon as the clocks are locked, without driver help
         MacPeriphSoC.mac_add_sdram(self,
-                                   hwinit = False,
+                                   hwinit = sdram_hwinit,
                                    sdram_dfii_base = 0xf0a02800,
                                    ddrphy_base = 0xf0a01800,
                                    version = version) # FIXME: can we get the appropriate value here ??? or are they only available after finalize ???
@@ -202,7 +228,15 @@ class QuadraFPGA(MacPeriphSoC):
         ###good_to_go = Signal()
         ###self.comb += [ good_to_go.eq((hold_reset_ctr == 0) & self.crg.locked & self.sdram_init.done) ]
         hold_reset = Signal()
-        self.comb += [ hold_reset.eq(~(hold_reset_ctr == 0) | ~self.crg.locked) ]# | ~self.sdram_init.done) ]
+        bridge_ready = None
+        if (sdram_hwinit):
+            self.comb += [ hold_reset.eq(~(hold_reset_ctr == 0) | ~self.crg.locked | ~self.sdram_init.done) ]
+            self.submodules.sdram_status = _SDRAMInitStatus(init_done = self.sdram_init.done, locked = self.crg.locked, ready = ~hold_reset)
+            # there's no halt output to the 68040, so the bridge itself doesn't answer until the SDRAM is usable
+            bridge_ready = Signal()
+            self.comb += [ bridge_ready.eq(~hold_reset) ]
+        else:
+            self.comb += [ hold_reset.eq(~(hold_reset_ctr == 0) | ~self.crg.locked) ]# | ~self.sdram_init.done) ]
         ## halt_n = platform.request("halt_3v3_n")
         ## self.comb += [ halt_n.eq(~hold_reset) ] # release the 68030 only when everything's fine
         #self.comb += [ halt_n.eq(1) ] # release the 68030 only when everything's fine
@@ -221,8 +255,20 @@ class QuadraFPGA(MacPeriphSoC):
         irq_line = self.platform.request("nmrq6_3v3_n") # active low
         fb_irq = Signal(reset = 1) # active low
         audio_irq = Signal(reset = 1) # active low
-        self.comb += irq_line.eq(fb_irq & audio_irq) # active low, enable if one is lows
-            
+        ring_irq = Signal(reset = 1) # active low
+        if (irq_ctrl):
+            # single status/ack register, masks & coalescing
+            from irq_ctrl import IRQController
+            # Goblin's interrupts are held until acknowledged in Goblin, the ring's are pulses
+            irq_sources = [("fb", fb_irq, "level"), ("audio", audio_irq, "level")]
+            if (cmd_ring):
+                irq_sources.append(("ring", ring_irq))
+            self.submodules.irqctrl = IRQController(sources = irq_sources)
+            self.comb += irq_line.eq(self.irqctrl.irq_n)
+        else:
+            self.comb += irq_line.eq(fb_irq & audio_irq) # active low, enable if one is lows
+
+        # the bridge follows the bus width, with --bus-data-width 128 a line is a single wishbone access
         wishbone_master_sys = wishbone.Interface(data_width=self.bus.data_width)
         self.submodules.wishbone_master_pds040 = WishboneDomainCrossingMaster(platform=self.platform, slave=wishbone_master_sys, cd_master="cpu", cd_slave="sys")
         self.bus.add_master(name="PDS040BridgeToWishbone", master=wishbone_master_sys)
@@ -231,6 +277,21 @@ class QuadraFPGA(MacPeriphSoC):
         #self.submodules.wishbone_writemaster_pds040 = WishboneDomainCrossingMaster(platform=self.platform, slave=wishbone_writemaster_sys, cd_master="cpu", cd_slave="sys")
         self.bus.add_master(name="PDS040BridgeToWishbone_Write", master=wishbone_writemaster_sys)
 
+        if (write_queues):
+            # posted writes to SDRAM and to the direct slot window (CSRs, accelerator) don't wait behind each other,
+            # CSR writes (e.g. doorbells) still wait for earlier framebuffer writes unless relaxed, then the driver
+            # uses the fence (a write to the fence line is only acknowledged once all posted writes are done)
+            wishbone_writemaster_fb_sys = wishbone.Interface(data_width=self.bus.data_width)
+            self.bus.add_master(name="PDS040BridgeToWishbone_WriteFB", master=wishbone_writemaster_fb_sys)
+            wishbone_writemaster_csr_sys = wishbone.Interface(data_width=self.bus.data_width)
+            self.bus.add_master(name="PDS040BridgeToWishbone_WriteCSR", master=wishbone_writemaster_csr_sys)
+            bridge_write_queues = [ ("fb", wishbone_writemaster_fb_sys, 0x80000000, 0x10000000, []),
+                                    ("csr", wishbone_writemaster_csr_sys, 0xF0800000, 0x00800000, [] if write_queues_relaxed else ["fb"]) ]
+            bridge_fence_address = 0xFEBFFFF0 # end of the unused space below the CSRs in the direct slot window
+        else:
+            bridge_write_queues = []
+            bridge_fence_address = None
+
         if (False):
             wb_forziscreen = wishbone.Interface(data_width=self.bus.data_width)
             from VintageBusFPGA_Common.Ziscreen import Ziscreen
@@ -240,24 +301,150 @@ class QuadraFPGA(MacPeriphSoC):
         else:    
             self.ziscreen_fifo = None
         
+        dram_native_r = self.sdram.crossbar.get_port(mode="read", data_width=128, clock_domain="cpu")
+        dram_native_w = self.sdram.crossbar.get_port(mode="write", data_width=128, clock_domain="cpu")
+        if (dram_qos):
+            # bandwidth caps & back-pressure counters
+            # FIXME: no scanout priority, Goblin's line buffer level isn't exported (VintageBusFPGA_Common)
+            from dram_qos import DRAMPortQoS
+            self.submodules.dram_qos_r = DRAMPortQoS(dram_native_r)
+            self.submodules.dram_qos_w = DRAMPortQoS(dram_native_w)
+            dram_native_r = self.dram_qos_r.user_port
+            dram_native_w = self.dram_qos_w.user_port
+        
+        if (scratchpad):
+            # block RAM at 0xFEC00000 in slot space, served by the bridge without leaving the cpu domain
+            from scratchpad import Scratchpad
+            self.submodules.scratchpad = Scratchpad(base = 0xF0C00000, size = 0x2000, cd_cpu = "cpu")
+            self.add_window_slave("scratchpad", self.scratchpad.bus, self.scratchpad.base, self.scratchpad.size)
+        else:
+            self.scratchpad = None
+
+        if (heatmap):
+            # per-page access counters for the card & Mac windows, read back with heatmap_report.py
+            from heatmap import AccessHeatmap, default_windows
+            self.submodules.heatmap = AccessHeatmap(windows = default_windows, cd_cpu = "cpu")
+        else:
+            self.heatmap = None
+
+        if (tt_counters):
+            # transactions per transfer type & modifier, e.g. to see how many copies are MOVE16
+            from tt_counters import TransferTypeCounters
+            self.submodules.tt_counters = TransferTypeCounters(cd_cpu = "cpu")
+        else:
+            self.tt_counters = None
+
+        sdram_written = Signal() # by the SoC side masters, drops the bridge's MOVE16 prefetch, see below
+
         print(f"Adding the PDS040 bridge")
         import mc68040_fsm
         self.submodules.mc68040busbridge = mc68040_fsm.MC68040_FSM(soc=self,
                                                                         wb_read=self.wishbone_master_pds040,
                                                                         #wb_write=self.wishbone_writemaster_pds040,
                                                                         wb_write=wishbone_writemaster_sys,
-                                                                        dram_native_r=self.sdram.crossbar.get_port(mode="read", data_width=128, clock_domain="cpu"),
-                                                                        dram_native_w=self.sdram.crossbar.get_port(mode="write", data_width=128, clock_domain="cpu"),
+                                                                        dram_native_r=dram_native_r,
+                                                                        dram_native_w=dram_native_w,
                                                                         cd_cpu="cpu",
-                                                                        trace_inst_fifo=self.ziscreen_fifo)
+                                                                        trace_inst_fifo=self.ziscreen_fifo,
+                                                                        endian_windows=endian_windows,
+                                                                        declrom_shadow=self.declrom_shadow,
+                                                                        write_queues=bridge_write_queues,
+                                                                        fence_address=bridge_fence_address,
+                                                                        scratchpad=self.scratchpad,
+                                                                        heatmap=self.heatmap,
+                                                                        move16=move16,
+                                                                        move16_invalidate=sdram_written,
+                                                                        tt_counters=self.tt_counters,
+                                                                        ready=bridge_ready)
         if (goblin):
             MacPeriphSoC.mac_add_goblin(self, use_goblin_alt = use_goblin_alt, hdmi = hdmi, goblin_res = goblin_res, goblin_irq = fb_irq, audio_irq = audio_irq)
 
+        vbl_n = Signal(reset = 1) # active low, sys domain
+        if (clut_commit):
+            # VBL from the vsync of Goblin's timing generator (hdmi domain); not the framebuffer interrupt,
+            # which is held until the driver acknowledges it in Goblin
+            vtg = getattr(getattr(self, "goblin", None), "video_framebuffer_vtg", None)
+            if (vtg is None):
+                print(" ***** ERROR ***** : Goblin's video timing generator (goblin.video_framebuffer_vtg) not found, no VBL for the CLUT commit\n");
+                assert(False)
+            vsync_n = Signal(reset = 1)
+            self.comb += vsync_n.eq(~vtg.source.vsync)
+            self.specials += MultiReg(vsync_n, vbl_n, reset = 1)
+
+        if (clut_commit):
+            # palette staging buffer at 0xFEC20000 in slot space (after the scratchpad), burst-writable, copied at VBL
+            # FIXME: the Goblin CLUT registers are in VintageBusFPGA_Common, 'index_reg'/'data_reg' are left to the driver
+            from clut_commit import CLUTCommit
+            self.submodules.clut_commit = CLUTCommit(vbl_n = vbl_n)
+            self.add_window_slave("clut_staging", self.clut_commit.bus, 0xF0C20000, 0x400)
+            self.bus.add_master(name="CLUTCommit", master=self.clut_commit.master)
+
+        if (cmd_ring):
+            # accelerator commands queued in SDRAM (by default at the end of the framebuffer window, so the
+            # host fills it through the burst write path), executed as wishbone accesses to the registers
+            from cmd_ring import CmdRing
+            self.submodules.cmd_ring = CmdRing(port = self.sdram.crossbar.get_port(mode="read", data_width=128))
+            self.bus.add_master(name="CmdRing", master=self.cmd_ring.bus)
+            self.comb += ring_irq.eq(~self.cmd_ring.irq) # fence interrupts only with the interrupt controller
+
+        if (dram_bench):
+            # bandwidth & latency left for the CPU with the current scanout/bridge traffic (and QoS settings)
+            from dram_bench import DRAMBench
+            bench_write_port = self.sdram.crossbar.get_port(mode="write")
+            self.submodules.dram_bench = DRAMBench(write_port = bench_write_port,
+                                                   read_port = self.sdram.crossbar.get_port(mode="read"))
+
+        if (status_mailbox):
+            # the driver polls this in SDRAM (cacheable) instead of the CSRs (uncached, through the bridge)
+            # interrupt event counts & pending interrupts, from the interrupt controller; accelerator busy & audio
+            # position are inside Goblin (VintageBusFPGA_Common), not exported, so not in the block
+            if (not irq_ctrl):
+                print(" ***** ERROR ***** : The status mailbox requires the interrupt controller (irq_ctrl)\n");
+                assert(False)
+            from status_mailbox import StatusMailbox
+            mailbox_sources = [("fb_events", self.irqctrl.fb_events.status),
+                               ("audio_events", self.irqctrl.audio_events.status),
+                               ("irq_pending", self.irqctrl.pending.status)]
+            if (sdram_hwinit):
+                mailbox_sources.append(("sdram_status", self.sdram_status.status.status))
+            mailbox_port = self.sdram.crossbar.get_port(mode="write", data_width=128)
+            self.submodules.status_mailbox = StatusMailbox(port = mailbox_port,
+                                                           sources = mailbox_sources)
+
+        if (move16):
+            # SDRAM writes by the other masters (sys domain) drop the bridge's MOVE16 prefetch.
+            # The wishbone ones include the command ring & the bridge's own write queues.
+            # FIXME: Goblin's accelerator writes through its own port in VintageBusFPGA_Common and isn't seen here,
+            # the driver must wait for the accelerator to be idle before MOVE16 reads of its result (noted in decl_rom_config.mak)
+            sdram_writes = []
+            if ("main_ram" in self.bus.slaves):
+                main_ram = self.bus.slaves["main_ram"]
+                sdram_writes.append(main_ram.cyc & main_ram.stb & main_ram.we & main_ram.ack)
+            else:
+                print(" ***** WARNING ***** : No main_ram wishbone slave, its writes won't drop the MOVE16 prefetch\n");
+            if (status_mailbox):
+                sdram_writes.append(mailbox_port.cmd.valid & mailbox_port.cmd.ready)
+            if (dram_bench):
+                sdram_writes.append(bench_write_port.cmd.valid & bench_write_port.cmd.ready)
+            self.comb += sdram_written.eq(reduce(or_, sdram_writes, 0))
+
         if (False):
             wb_forzscreen = wishbone.Interface(data_width=self.bus.data_width)
             from VintageBusFPGA_Common.Zscreen import Zscreen
             self.submodules.zscreen = Zscreen(platform=platform, wb=wb_forzscreen)
             self.bus.add_master(name="screentrace", master=wb_forzscreen)
+
+    # our slaves in the direct slot window, which Goblin & the other VintageBusFPGA_Common parts share
+    def add_window_slave(self, name, slave, origin, size):
+        for (other, region) in self.bus.regions.items():
+            if ((origin < (region.origin + region.size)) and (region.origin < (origin + size))):
+                print(f" ***** ERROR ***** : {name} at 0x{origin:08x} overlaps {other} (0x{region.origin:08x}-0x{region.origin + region.size - 1:08x})\n");
+                assert(False)
+        for (other, base) in self.mem_map.items():
+            if ((base >= origin) and (base < (origin + size))):
+                print(f" ***** ERROR ***** : {name} at 0x{origin:08x} overlaps {other} (0x{base:08x})\n");
+                assert(False)
+        self.bus.add_slave(name, slave, SoCRegion(origin=origin, size=size, cached=False))
             
         
 def main():
@@ -270,6 +457,21 @@ def main():
     parser.add_argument("--goblin", action="store_true", help="add a goblin framebuffer")
     parser.add_argument("--goblin-res", default="1920x1080@60Hz", help="Specify the goblin resolution")
     parser.add_argument("--goblin-alt", action="store_true", help="Use alternate HDMI Phy with Audio support (requires Full HD resolution)")
+    parser.add_argument("--sdram-hwinit", action="store_true", help="Initialize & calibrate the SDRAM in hardware at startup, instead of from the driver")
+    parser.add_argument("--irq-ctrl", action="store_true", help="Add an interrupt controller (status/ack/mask registers, coalescing) in front of NMRQ6")
+    parser.add_argument("--dram-qos", action="store_true", help="Add bandwidth caps & back-pressure counters to the bridge SDRAM ports")
+    parser.add_argument("--status-mailbox", action="store_true", help="Mirror status (interrupt event counts, pending interrupts) to a block in SDRAM for the driver to poll (requires --irq-ctrl)")
+    parser.add_argument("--cmd-ring", action="store_true", help="Add a command ring in SDRAM, executed as register writes (for batched accelerator commands)")
+    parser.add_argument("--write-queues", action="store_true", help="Separate posted write queues for SDRAM and for the CSRs, plus a write fence")
+    parser.add_argument("--write-queues-relaxed", action="store_true", help="With --write-queues, don't order CSR writes after SDRAM writes (the driver uses the fence)")
+    parser.add_argument("--heatmap", action="store_true", help="Add per-page access counters for the slot, superslot and memory windows")
+    parser.add_argument("--move16", action="store_true", help="MOVE16 fast paths in the bridge: native SDRAM writes to superslot space, next-line read prefetch")
+    parser.add_argument("--tt-counters", action="store_true", help="Add transaction counters per 68040 transfer type/modifier")
+    parser.add_argument("--scratchpad", action="store_true", help="Add an 8 KiB block RAM scratchpad in slot space, served by the bridge in the cpu domain")
+    parser.add_argument("--clut-commit", action="store_true", help="Add a burst-writable CLUT/gamma staging buffer copied to the palette at VBL (requires --goblin)")
+    parser.add_argument("--dram-bench", action="store_true", help="Add an SDRAM bandwidth/latency benchmark engine (LiteDRAM BIST plus a latency probe)")
+    parser.add_argument("--declrom-shadow", action="store_true", help="Copy the declaration ROM to block RAM at startup and serve it from there")
+    parser.add_argument("--native-endian-window", action="append", default=[], help="Serve the 68040 address window BASE:SIZE (hex) with native big-endian byte lanes instead of swapped ones, can be repeated (e.g. fe000000:800000 for the framebuffer)")
     builder_args(parser)
     vivado_build_args(parser)
     args = parser.parse_args()
@@ -278,6 +480,14 @@ def main():
         print(" ***** ERROR ***** : Goblin Alt PHY currently only supports Full HD\n");
         assert(False)
 
+    if (args.clut_commit and not args.goblin):
+        print(" ***** ERROR ***** : The CLUT commit engine requires the framebuffer (--goblin)\n");
+        assert(False)
+
+    if (args.status_mailbox and not args.irq_ctrl):
+        print(" ***** ERROR ***** : The status mailbox requires the interrupt controller (--irq-ctrl)\n");
+        assert(False)
+
     if (True):
         f = open("decl_rom_config.mak","w+")
         hres = int(args.goblin_res.split("@")[0].split("x")[0])
@@ -291,27 +501,71 @@ def main():
             f.write(" -DENABLE_HDMI_ALT_CHANGE");
             if (args.version == "V1.0"):
                 f.write(" -DENABLE_HDMI_ALT_CHANGE_48MHZ");
+        if (args.sdram_hwinit):
+            f.write(" -DENABLE_SDRAM_HWINIT") # no need for the driver to init/calibrate the SDRAM
+        if (args.irq_ctrl):
+            f.write(" -DENABLE_IRQ_CTRL") # ISR uses the consolidated status/ack registers
+        if (args.cmd_ring):
+            f.write(" -DENABLE_CMD_RING") # accelerator commands go through the ring
+        if (args.write_queues):
+            f.write(" -DENABLE_WRITE_FENCE") # fence line at 0xFEBFFFF0 (slot $E)
+        if (args.status_mailbox):
+            f.write(" -DENABLE_STATUS_MAILBOX") # driver polls the status block in SDRAM
+        if (args.scratchpad):
+            f.write(" -DENABLE_SCRATCHPAD") # driver state at 0xFEC00000
+        if (args.clut_commit):
+            f.write(" -DENABLE_CLUT_COMMIT") # palette staged at 0xFEC20000, committed at VBL
+        if (args.dram_bench):
+            f.write(" -DENABLE_DRAM_BENCH") # benchmark CSRs (dram_bench_*)
+        if (args.move16):
+            f.write(" -DENABLE_MOVE16") # copies to/from/within superslot space with MOVE16
                 
         f.write("\n");
+        if (args.move16):
+            f.write("# ENABLE_MOVE16: the prefetch isn't dropped by the accelerator's writes, wait for it to be idle before MOVE16 reads of its result\n");
         f.write(f"HRES={hres}\n");
         f.write(f"VRES={vres}\n");
         f.close()
     
-    soc = QuadraFPGA(**soc_core_argdict(args),
-                     variant=args.variant,
-                     version=args.version,
-                     sys_clk_freq=int(float(args.sys_clk_freq)),
-                     config_flash=args.config_flash,
-                     goblin=args.goblin,
-                     goblin_res=args.goblin_res,
-                     use_goblin_alt=args.goblin_alt)
+    endian_windows = []
+    for window in args.native_endian_window:
+        base, size = window.split(":")
+        endian_windows.append((int(base, 16), int(size, 16), False))
+
+    build_report = BuildReport()
+    with build_report.stage("elaborate"):
+        soc = QuadraFPGA(**soc_core_argdict(args),
+                         variant=args.variant,
+                         version=args.version,
+                         sys_clk_freq=int(float(args.sys_clk_freq)),
+                         config_flash=args.config_flash,
+                         goblin=args.goblin,
+                         goblin_res=args.goblin_res,
+                         use_goblin_alt=args.goblin_alt,
+                         endian_windows=endian_windows,
+                         declrom_shadow=args.declrom_shadow,
+                         sdram_hwinit=args.sdram_hwinit,
+                         irq_ctrl=args.irq_ctrl,
+                         dram_qos=args.dram_qos,
+                         status_mailbox=args.status_mailbox,
+                         cmd_ring=args.cmd_ring,
+                         write_queues=args.write_queues,
+                         write_queues_relaxed=args.write_queues_relaxed,
+                         dram_bench=args.dram_bench,
+                         scratchpad=args.scratchpad,
+                         heatmap=args.heatmap,
+                         clut_commit=args.clut_commit,
+                         move16=args.move16,
+                         tt_counters=args.tt_counters)
 
     version_for_filename = args.version.replace(".", "_")
 
     soc.platform.name += "_" + version_for_filename
     
     builder = Builder(soc, **builder_argdict(args))
-    builder.build(**vivado_build_argdict(args), run=args.build)
+    with build_report.stage("build"): # Verilog generation, plus Vivado with --build
+        builder.build(**vivado_build_argdict(args), run=args.build)
+    print("Build report in " + build_report.finish(builder.gateware_dir, soc.platform.name))
 
     # Generate modified CSR registers definitions/access functions to netbsd_csr.h.
     # should be split per-device (and without base) to still work if we have identical devices in different configurations on multiple boards
@@ -0,0 +1,32 @@
+from migen import *
+
+from litex.soc.interconnect import wishbone
+
+# Block RAM scratchpad in the direct slot window, for driver state (ring pointers, semaphores, small tables)
+# The bridge serves it from the cpu clock domain (port 'cpu_port', 1 cycle latency, no wishbone or CDC),
+# hardware engines share it through 'bus' (wishbone slave, sys domain)
+# Accesses from the host are not ordered with the writes still posted in the bridge FIFOs (use the fence)
+class Scratchpad(Module):
+    def __init__(self, base, size = 0x2000, cd_cpu="cpu"):
+        # base is the wishbone byte address, in the second 8 MiB of slot space
+        assert(((size & (size - 1)) == 0) and ((base & (size - 1)) == 0)) # naturally aligned power of two
+        self.base = base
+        self.size = size
+        words = size // 4
+
+        self.bus = bus = wishbone.Interface(data_width=32) # slave
+
+        self.specials.mem = Memory(32, words)
+        self.cpu_port = self.mem.get_port(write_capable=True, we_granularity=8, clock_domain=cd_cpu) # for the bridge
+        sys_port = self.mem.get_port(write_capable=True, we_granularity=8)
+        self.specials += self.cpu_port, sys_port
+
+        self.comb += [
+            sys_port.adr.eq(bus.adr[0:log2_int(words)]),
+            sys_port.dat_w.eq(bus.dat_w),
+            sys_port.we.eq(Replicate(bus.cyc & bus.stb & bus.we & ~bus.ack, 4) & bus.sel),
+            bus.dat_r.eq(sys_port.dat_r),
+        ]
+        self.sync += [
+            bus.ack.eq(bus.cyc & bus.stb & ~bus.ack),
+        ]
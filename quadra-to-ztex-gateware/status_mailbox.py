@@ -0,0 +1,66 @@
+from migen import *
+
+from litex.soc.interconnect.csr import *
+
+# Status mailbox: writes a packed status block to SDRAM through a native write port (in the sys domain),
+# when a source changes and/or every 'period' cycles, so the driver can poll it with cacheable line reads
+# Each 16 bytes line is a 32 bits sequence number followed by 96 bits of sources (packed in order, LSB first)
+# The sequence number is the same in all lines of an update, the driver re-reads if they differ
+# The block is written as 32 bits little-endian words, the driver swaps unless it's in a native endian window
+class StatusMailbox(Module, AutoCSR):
+    def __init__(self, port, sources, base = 0x8fff0000):
+        payload = Cat(*[signal for (name, signal) in sources])
+        nlines = (len(payload) + 95) // 96
+
+        self.base = CSRStorage(32, reset = base, description="SDRAM byte address of the block (16 bytes aligned)")
+        self.period = CSRStorage(32, reset = 0, description="Cycles between forced updates, 0 for updates on change only")
+        self.ctrl = CSRStorage(fields=[CSRField("enable", size=1, description="Write the block")])
+        self.updates = CSRStatus(32, description="Blocks written")
+
+        seq = Signal(32)
+        snapshot = Signal(nlines * 96)
+        line = Signal(max=max(2, nlines))
+        period_ctr = Signal(32)
+        changed = Signal()
+        expired = Signal()
+        self.comb += [
+            changed.eq(payload != snapshot[0:len(payload)]),
+            expired.eq((self.period.storage != 0) & (period_ctr >= self.period.storage)),
+        ]
+
+        self.comb += [
+            port.cmd.we.eq(1),
+            port.cmd.addr.eq(self.base.storage[4:] + line),
+            port.wdata.we.eq(2**len(port.wdata.we)-1),
+            port.wdata.data.eq(Cat(seq, Array([snapshot[i*96:(i+1)*96] for i in range(nlines)])[line])),
+        ]
+
+        self.submodules.fsm = fsm = FSM(reset_state="Idle")
+        fsm.act("Idle",
+                NextValue(period_ctr, period_ctr + 1),
+                If(self.ctrl.fields.enable & (changed | expired),
+                   NextValue(snapshot, payload),
+                   NextValue(seq, seq + 1),
+                   NextValue(period_ctr, 0),
+                   NextValue(line, 0),
+                   NextState("Cmd"),
+                ),
+        )
+        fsm.act("Cmd",
+                port.cmd.valid.eq(1),
+                If(port.cmd.ready,
+                   NextState("Data"),
+                ),
+        )
+        fsm.act("Data",
+                port.wdata.valid.eq(1),
+                If(port.wdata.ready,
+                   If(line == (nlines - 1),
+                      NextValue(self.updates.status, self.updates.status + 1),
+                      NextState("Idle"),
+                   ).Else(
+                       NextValue(line, line + 1),
+                       NextState("Cmd"),
+                   ),
+                ),
+        )
@@ -0,0 +1,45 @@
+import os
+import unittest
+
+from build_report import parse_gateware_dir, compare_reports
+
+# trimmed Vivado 2022.2 log & reports of a ztex2.13a build
+fixture_dir = os.path.join(os.path.dirname(__file__), "build_report")
+build_name = "ztex213_pds040_V1_0"
+
+class TestBuildReport(unittest.TestCase):
+    def setUp(self):
+        self.r = parse_gateware_dir(fixture_dir, build_name)
+
+    def test_vivado_phases(self):
+        phases = self.r["vivado_phases"]
+        self.assertEqual(phases["route_design"], { "cpu_s": 62, "elapsed_s": 48, "peak_MB": 2873.215 })
+        # phys_opt_design runs twice, the times add up
+        self.assertEqual(phases["phys_opt_design"]["elapsed_s"], 5)
+        self.assertEqual(phases["phys_opt_design"]["peak_MB"], 2891.330)
+
+    def test_utilization(self):
+        util = self.r["utilization"]
+        self.assertEqual(util["Slice LUTs"], { "used": 15487, "available": 20800, "util_pct": 74.46 })
+        # half tiles, and the RAMB36/RAMB18 sub-rows are not taken
+        self.assertEqual(util["Block RAM Tile"], { "used": 38.5, "available": 50, "util_pct": 77.00 })
+        self.assertEqual(util["DSPs"]["used"], 4)
+        self.assertEqual(util["BUFGCTRL"]["available"], 32)
+
+    def test_timing(self):
+        self.assertEqual(self.r["wns_ns"], { "sys": 0.412, "cpu": 1.137, "hdmi": -0.214 })
+        self.assertEqual(self.r["timing"]["hdmi_clk"]["tns_ns"], -1.903)
+        # no setup paths (pulse width only), and nothing from the Inter Clock Table
+        self.assertNotIn("clk48", self.r["timing"])
+        self.assertNotIn("idelayclk", self.r["timing"])
+        self.assertEqual(self.r["timing"]["sysclk"]["whs_ns"], 0.052)
+
+    def test_compare(self):
+        base = dict(self.r, stages={}, peak_rss_MB={ "self": 0.0, "children": 0.0 })
+        new = dict(base, wns_ns=dict(self.r["wns_ns"], sys=-0.1))
+        # hdmi was already failing in the base
+        self.assertEqual(compare_reports(base, new), 1)
+        self.assertEqual(compare_reports(base, base), 0)
+
+if __name__ == "__main__":
+    unittest.main()
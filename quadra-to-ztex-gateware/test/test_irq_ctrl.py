@@ -0,0 +1,59 @@
+import unittest
+
+from migen import *
+
+from irq_ctrl import IRQController
+
+class TestIRQController(unittest.TestCase):
+    # returns the number of interrupts raised for 'source' (the ISR acks each one as soon as it's pending)
+    def run_source(self, source, count=1, interval=0, pulses=0, hold=False, cycles=400):
+        line_n = Signal(reset=1)
+        dut = IRQController(sources=[(source, line_n) if not hold else (source, line_n, "level")])
+        raised = []
+        def stimulus():
+            yield getattr(dut, f"{source}_count").storage.eq(count)
+            yield getattr(dut, f"{source}_interval").storage.eq(interval)
+            for _ in range(4):
+                yield
+            if hold: # asserted until the end
+                yield line_n.eq(0)
+            for _ in range(pulses):
+                yield line_n.eq(0)
+                yield
+                yield line_n.eq(1)
+                for _ in range(9):
+                    yield
+        def isr():
+            prev = 0
+            for _ in range(cycles):
+                pending = (yield dut.pending.status) & 1
+                if pending and not prev:
+                    raised.append(True)
+                yield dut.ack.r.eq(1)
+                yield dut.ack.re.eq(pending)
+                prev = pending
+                yield
+        run_simulation(dut, [stimulus(), isr()])
+        return len(raised)
+
+    def test_interrupt_per_event(self):
+        self.assertEqual(self.run_source("ring", pulses=5), 5)
+
+    def test_count_without_interval(self):
+        # count is honored with interval = 0: N events, exactly one interrupt
+        self.assertEqual(self.run_source("ring", count=4, pulses=4), 1)
+        self.assertEqual(self.run_source("ring", count=4, pulses=8), 2)
+        # and there's no timeout, so fewer events raise nothing
+        self.assertEqual(self.run_source("ring", count=4, pulses=3), 0)
+
+    def test_count_with_timeout(self):
+        # fewer events than 'count', raised once 'interval' after the first one
+        self.assertEqual(self.run_source("ring", count=8, interval=50, pulses=2), 1)
+
+    def test_level_source(self):
+        # a line held until acknowledged at the source is a single event, raised without waiting for 'count'
+        self.assertEqual(self.run_source("fb", count=4, hold=True), 1)
+        self.assertEqual(self.run_source("fb", count=4, interval=50, hold=True), 1)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,60 @@
+import unittest
+
+from migen import *
+from migen.sim import passive
+
+import bridge_replay
+
+class TestMove16Prefetch(unittest.TestCase):
+    # a MOVE16 read prefetches the next line, which another SDRAM master then overwrites before the 68040 reads it
+    def run_other_writer(self, invalidate):
+        src = bridge_replay.superslot_base + 0x200000
+        txns = bridge_replay.parse_trace([f"0 R 16 {src:08x} tt=1", f"80 R 16 {src + 16:08x} tt=1"])
+        move16_invalidate = Signal()
+        r = bridge_replay._Replay(txns, bridge_replay.default_config, { "move16": True, "move16_invalidate": move16_invalidate })
+        @passive
+        def other_master():
+            for _ in range(160): # sys cycles, the prefetch is back by then
+                yield
+            soc = bridge_replay._soc_address(src + 16)
+            for i in range(16):
+                r.mem[soc + i] = 0xa0 + i
+                r.expected[src + 16 + i] = 0xa0 + i # byte addresses are preserved
+            if invalidate:
+                yield move16_invalidate.eq(1)
+                yield
+                yield move16_invalidate.eq(0)
+            while True:
+                yield
+        r.run(extra_generators={ "sys": [other_master()] })
+        return r.report()
+
+    def test_invalidated(self):
+        r = self.run_other_writer(invalidate=True)
+        self.assertEqual(r["mismatches"], 0)
+        self.assertEqual(r["burst_counters"]["move16_prefetch_hits"], 0)
+
+    def test_stale_without_invalidate(self):
+        # the check above does see the stale line
+        r = self.run_other_writer(invalidate=False)
+        self.assertEqual(r["burst_counters"]["move16_prefetch_hits"], 1)
+        self.assertGreater(r["mismatches"], 0)
+
+    def test_no_prefetch_after_wishbone_line(self):
+        # with a 128 bits bus, a MOVE16 read of the CSR window is a single wishbone access, the next "line" isn't in SDRAM
+        txns = bridge_replay.parse_trace([f"0 R 16 {bridge_replay.csr_base + 0x2000:08x} tt=1", "80 R L e0000000"])
+        config = dict(bridge_replay.default_config, wb_data_width=128)
+        r = bridge_replay._Replay(txns, config, { "move16": True })
+        native_reads = []
+        @passive
+        def dram_reads():
+            port = r.dut.dram_native_r
+            while True:
+                if (yield port.cmd.valid) and (yield port.cmd.ready):
+                    native_reads.append((yield port.cmd.addr))
+                yield
+        r.run(extra_generators={ "cpu": [dram_reads()] })
+        self.assertEqual(native_reads, [])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,75 @@
+from migen import *
+from migen.genlib.cdc import MultiReg, PulseSynchronizer
+
+from litex.soc.interconnect.csr import *
+
+# Transaction counters per transfer type (TT) & modifier (TM), to see what the 68040 actually sends to the card
+# (e.g. how many of the copies are MOVE16, TT = 1, or how much is supervisor vs user, code vs data)
+# Every transaction start (TS) the bridge claims bumps the counter of its direction, TT & TM; like the heatmap
+# the table is in block RAM, updated read-modify-write in the cpu domain
+# The host reads it an entry at a time through 'index'/'count', entry = write << 5 | TT << 3 | TM
+class TransferTypeCounters(Module, AutoCSR):
+    def __init__(self, cd_cpu="cpu"):
+        entries = 64
+
+        # from the bridge, cpu domain
+        self.access = Signal() # TS, for the card
+        self.write = Signal()
+        self.tt = Signal(2)
+        self.tm = Signal(3)
+
+        self.ctrl = CSRStorage(fields=[CSRField("enable", size=1, description="Count transactions"),
+                                       CSRField("clear", size=1, pulse=True, description="Zero the table")])
+        self.index = CSRStorage(6, description="Entry read in 'count' (write << 5 | TT << 3 | TM)")
+        self.count = CSRStatus(32, description="Transactions of that direction, TT & TM")
+
+        self.specials.mem = Memory(32, entries)
+        cpu_port = self.mem.get_port(write_capable=True, clock_domain=cd_cpu)
+        sys_port = self.mem.get_port()
+        self.specials += cpu_port, sys_port
+
+        self.comb += [
+            sys_port.adr.eq(self.index.storage),
+            self.count.status.eq(sys_port.dat_r),
+        ]
+
+        cpu_sync = getattr(self.sync, cd_cpu)
+
+        enable = Signal()
+        self.specials += MultiReg(self.ctrl.fields.enable, enable, cd_cpu)
+        self.submodules.clear_ps = PulseSynchronizer("sys", cd_cpu)
+        self.comb += self.clear_ps.i.eq(self.ctrl.fields.clear)
+
+        # read at TS, write back the next cycle
+        entry = Signal(6)
+        clearing = Signal()
+        clear_index = Signal(6)
+        update = Signal()
+        update_entry = Signal(6)
+        self.comb += [
+            entry.eq(Cat(self.tm, self.tt, self.write)),
+            If(clearing,
+               cpu_port.adr.eq(clear_index),
+               cpu_port.dat_w.eq(0),
+               cpu_port.we.eq(1),
+            ).Elif(update,
+               cpu_port.adr.eq(update_entry),
+               cpu_port.dat_w.eq(cpu_port.dat_r + 1),
+               cpu_port.we.eq(1),
+            ).Else(
+               cpu_port.adr.eq(entry),
+            ),
+        ]
+        cpu_sync += [
+            update.eq(enable & ~clearing & self.access),
+            update_entry.eq(entry),
+            If(self.clear_ps.o,
+               clearing.eq(1),
+               clear_index.eq(0),
+            ).Elif(clearing,
+               clear_index.eq(clear_index + 1),
+               If(clear_index == (entries - 1),
+                  clearing.eq(0),
+               ),
+            ),
+        ]